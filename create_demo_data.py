@@ -5,8 +5,92 @@
 import json
 import pandas as pd
 import numpy as np
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 import os
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，缺失时回退到标准库json
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # 可选依赖，缺失时不输出Feather副本
+    pa = None
+
+WRITE_BUFFER_SIZE = 1 << 20  # 1MB写缓冲，减少write系统调用
+
+def write_csv(df, path):
+    """写出带BOM的UTF-8 CSV（Excel可直接打开）
+
+    使用pandas.to_csv而非pyarrow的CSV写入器：后者会给所有字符串加引号、
+    把2.0写成2，输出格式与下游读取方不一致
+    """
+    with open(path, 'w', encoding='utf-8-sig', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+        df.to_csv(f, index=False)
+
+# 摘要表字段及其dtype：金额列用int64，比率列用float32（两位到四位小数，float32精度足够）
+SUMMARY_FIELDS = {
+    'revenue': np.int64,
+    'net_income': np.int64,
+    'total_assets': np.int64,
+    'shareholders_equity': np.int64,
+    'current_ratio': np.float32,
+    'debt_to_equity': np.float32,
+    'roe': np.float32,
+    'roa': np.float32,
+    'net_margin': np.float32,
+}
+
+@dataclass(frozen=True, slots=True)
+class CompanyPanel:
+    """
+    演示公司数据的列式视图（每个字段一个数组，按公司下标对齐）
+    
+    从嵌套字典只遍历一次构建，之后导出表格直接取整列，无需逐公司按键查找。
+    """
+    companies: np.ndarray
+    industries: np.ndarray
+    metrics: dict  # 字段名 -> np.ndarray，dtype见SUMMARY_FIELDS
+    history_lengths: np.ndarray  # 每家公司的历史年数
+    history_years: np.ndarray
+    history_revenue: np.ndarray
+    history_net_income: np.ndarray
+    
+    @classmethod
+    def from_demo_data(cls, demo_data):
+        """由create_demo_financial_data()的结果构建"""
+        all_metrics = [data['financial_metrics'] for data in demo_data.values()]
+        count = len(all_metrics)
+        return cls(
+            companies=np.array(list(demo_data), dtype=object),
+            industries=np.array([data['company_info']['industry'] for data in demo_data.values()], dtype=object),
+            metrics={
+                field: np.fromiter((metrics[field] for metrics in all_metrics), dtype=dtype, count=count)
+                for field, dtype in SUMMARY_FIELDS.items()
+            },
+            history_lengths=np.fromiter(
+                (len(metrics['historical_years']) for metrics in all_metrics), dtype=np.int64, count=count
+            ),
+            history_years=np.concatenate([metrics['historical_years'] for metrics in all_metrics]),
+            history_revenue=np.concatenate([metrics['historical_revenue'] for metrics in all_metrics]).astype(np.int64, copy=False),
+            history_net_income=np.concatenate([metrics['historical_net_income'] for metrics in all_metrics]).astype(np.int64, copy=False),
+        )
+    
+    def summary_frame(self):
+        """财务摘要表：每家公司一行"""
+        return pd.DataFrame({'company': self.companies, 'industry': self.industries, **self.metrics})
+    
+    def time_series_frame(self):
+        """时间序列表：每家公司每年一行"""
+        return pd.DataFrame({
+            'company': np.repeat(self.companies, self.history_lengths),
+            'year': self.history_years,
+            'revenue': self.history_revenue,
+            'net_income': self.history_net_income
+        })
 
 def create_demo_financial_data():
     """创建演示财务数据"""
@@ -136,55 +220,37 @@ def save_demo_data():
     demo_data = create_demo_financial_data()
     
     # 保存为JSON文件
-    with open('demo_financial_data.json', 'w', encoding='utf-8') as f:
-        json.dump(demo_data, f, ensure_ascii=False, indent=2)
+    # 先整体编码再一次性写入，避免json.dump逐token写文件
+    if orjson is not None:
+        payload = orjson.dumps(demo_data, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(demo_data, ensure_ascii=False, indent=2).encode('utf-8')
+    with open('demo_financial_data.json', 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(payload)
     
     print("✅ 演示数据已保存到 demo_financial_data.json")
     
-    # 创建CSV格式的数据用于分析
-    financial_summary = []
-    
-    for company_name, data in demo_data.items():
-        metrics = data['financial_metrics']
-        row = {
-            'company': company_name,
-            'industry': data['company_info']['industry'],
-            'revenue': metrics['revenue'],
-            'net_income': metrics['net_income'],
-            'total_assets': metrics['total_assets'],
-            'shareholders_equity': metrics['shareholders_equity'],
-            'current_ratio': metrics['current_ratio'],
-            'debt_to_equity': metrics['debt_to_equity'],
-            'roe': metrics['roe'],
-            'roa': metrics['roa'],
-            'net_margin': metrics['net_margin']
-        }
-        financial_summary.append(row)
+    # 转为列式视图，摘要表和时间序列表都直接按列构建
+    panel = CompanyPanel.from_demo_data(demo_data)
     
-    df = pd.DataFrame(financial_summary)
-    df.to_csv('demo_financial_summary.csv', index=False, encoding='utf-8-sig')
+    # 创建CSV格式的数据用于分析
+    df = panel.summary_frame()
+    write_csv(df, 'demo_financial_summary.csv')
     
     print("✅ 财务摘要已保存到 demo_financial_summary.csv")
     
     # 创建时间序列数据
-    time_series_data = []
-    
-    for company_name, data in demo_data.items():
-        metrics = data['financial_metrics']
-        for i, year in enumerate(metrics['historical_years']):
-            row = {
-                'company': company_name,
-                'year': year,
-                'revenue': metrics['historical_revenue'][i],
-                'net_income': metrics['historical_net_income'][i]
-            }
-            time_series_data.append(row)
-    
-    ts_df = pd.DataFrame(time_series_data)
-    ts_df.to_csv('demo_time_series.csv', index=False, encoding='utf-8-sig')
+    ts_df = panel.time_series_frame()
+    write_csv(ts_df, 'demo_time_series.csv')
     
     print("✅ 时间序列数据已保存到 demo_time_series.csv")
     
+    # 额外输出Feather列式文件，供下游快速重读（保留dtype，无需重新解析数字）
+    if pa is not None:
+        df.to_feather('demo_financial_summary.feather')
+        ts_df.to_feather('demo_time_series.feather')
+        print("✅ Feather副本已保存到 demo_financial_summary.feather / demo_time_series.feather")
+    
     return demo_data
 
 def create_demo_analysis_report():
@@ -238,8 +304,8 @@ def create_demo_analysis_report():
 这些演示数据将让您充分体验LlamaReportPro的所有AI功能！
 """
     
-    with open('DEMO_ANALYSIS_REPORT.md', 'w', encoding='utf-8') as f:
-        f.write(report)
+    # 预先编码为UTF-8后按二进制一次写入，不经过文本模式的换行转换
+    Path('DEMO_ANALYSIS_REPORT.md').write_bytes(report.encode('utf-8'))
     
     print("✅ 演示分析报告已保存到 DEMO_ANALYSIS_REPORT.md")
 
@@ -262,6 +328,7 @@ def main():
     print("  📄 demo_financial_data.json - 完整的公司财务数据")
     print("  📊 demo_financial_summary.csv - 财务指标摘要")
     print("  📈 demo_time_series.csv - 历史时间序列数据")
+    print("  🗃️ *.feather - 上述CSV的列式副本（需安装pyarrow）")
     print("  📋 DEMO_ANALYSIS_REPORT.md - 分析报告和使用指南")
     
     print("\n🚀 下一步操作:")
@@ -3,18 +3,84 @@
 用于Agent系统集成
 """
 
+import asyncio
+import functools
+import json
 import logging
-from typing import Dict, Any, Optional, List
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Sequence, Tuple
 import sys
 from pathlib import Path
 
-# 添加项目路径
+# 项目根目录（utils包所在位置），仅在需要时加入sys.path
 project_root = Path(__file__).parent.parent.parent
-if str(project_root) not in sys.path:
-    sys.path.insert(0, str(project_root))
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # 可选依赖，缺失时使用标准库json
+    _json_loads = json.loads
 
 logger = logging.getLogger(__name__)
 
+# 页数不超过该值时串行解析PDF，避免进程池的启动开销
+_PARALLEL_PAGE_THRESHOLD = 8
+# 财务报表是带框线的表格，只按线条检测，不做文字对齐推断
+_TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+    "snap_tolerance": 3,
+    "intersection_tolerance": 3,
+}
+
+# 预编译的正则表达式
+# 标准库解码器，用于从任意位置解析一个完整的JSON值
+_JSON_DECODER = json.JSONDecoder()
+# 文本回退：一次扫描匹配全部指标（"非流动资产"不会被误当作"流动资产"）
+_METRIC_TEXT_RE = re.compile(r'(净利润|营业收入|总资产|股东权益|非流动资产|流动资产)[：:]\s*([\d,\.]+)')
+# 单元格清洗：去掉数字、小数点、负号以外的字符
+_NON_NUMERIC_RE = re.compile(r'[^\d\.\-]')
+
+# 表格行名关键词：指标 -> 匹配任一关键词的正则
+_METRIC_ROW_KEYWORDS = {
+    '净利润': ['净利润', '归属于母公司', '归母净利润'],
+    '营业收入': ['营业收入', '营业总收入', '主营业务收入'],
+    '总资产': ['总资产', '资产总计', '资产合计'],
+    '股东权益': ['股东权益', '所有者权益', '归属于母公司所有者权益'],
+    '流动资产': ['流动资产', '流动资产合计'],
+    '非流动资产': ['非流动资产', '非流动资产合计'],
+}
+_DUPONT_METRICS = frozenset(_METRIC_ROW_KEYWORDS)
+
+# 查询失败时返回的示例数据（便于测试）
+_SAMPLE_FINANCIAL_DATA = {
+    '净利润': 1000000000,  # 10亿
+    '营业收入': 5000000000,  # 50亿
+    '总资产': 10000000000,  # 100亿
+    '股东权益': 6000000000,  # 60亿
+    '流动资产': 4000000000,  # 40亿
+    '非流动资产': 6000000000,  # 60亿
+}
+_METRIC_ROW_PATTERNS = {
+    metric_name: re.compile('|'.join(map(re.escape, keywords)))
+    for metric_name, keywords in _METRIC_ROW_KEYWORDS.items()
+}
+
+
+@functools.cache
+def _get_dupont_analyzer():
+    """
+    获取共享的DupontAnalyzer实例（无状态，可复用）
+    
+    utils.financial_calculator会引入plotly/streamlit，因此在首次使用时才导入，
+    之后的调用直接复用同一个实例。模块导入（包括PDF解析工作进程）不再修改sys.path。
+    """
+    if 'utils.financial_calculator' not in sys.modules and str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+    from utils.financial_calculator import DupontAnalyzer
+    return DupontAnalyzer()
+
 
 def generate_dupont_analysis(
     company_name: str,
@@ -35,9 +101,6 @@ def generate_dupont_analysis(
         杜邦分析结果字典
     """
     try:
-        from utils.financial_calculator import DupontAnalyzer
-        from llamareport_backend.models.dupont_models import DupontAnalysis
-        
         logger.info(f"开始生成杜邦分析: {company_name} - {year}")
         
         # 如果没有提供财务数据，从query_engine提取
@@ -46,8 +109,8 @@ def generate_dupont_analysis(
                 company_name, year, query_engine
             )
         
-        # 创建杜邦分析器
-        analyzer = DupontAnalyzer()
+        # 获取共享的杜邦分析器
+        analyzer = _get_dupont_analyzer()
         
         # 执行杜邦分析
         dupont_result = analyzer.calculate_dupont_analysis(
@@ -70,6 +133,31 @@ def generate_dupont_analysis(
         raise
 
 
+async def generate_dupont_analysis_batch(
+    pairs: Sequence[Tuple[str, str]],
+    query_engine
+) -> List[Dict[str, Any]]:
+    """
+    批量生成多个(公司, 年份)的杜邦分析报告
+    
+    财务数据通过extract_financial_data_for_dupont_batch并发查询，
+    N家公司的报告不再需要N次串行的LLM往返。
+    
+    Args:
+        pairs: (公司名称, 年份) 列表
+        query_engine: LlamaIndex查询引擎
+        
+    Returns:
+        杜邦分析结果字典列表，顺序与pairs一致
+    """
+    all_financial_data = await extract_financial_data_for_dupont_batch(pairs, query_engine)
+    
+    return [
+        generate_dupont_analysis(company_name, year, query_engine, financial_data=financial_data)
+        for (company_name, year), financial_data in zip(pairs, all_financial_data)
+    ]
+
+
 def extract_financial_data_for_dupont(
     company_name: str,
     year: str,
@@ -89,8 +177,73 @@ def extract_financial_data_for_dupont(
     try:
         logger.info(f"开始提取财务数据: {company_name} - {year}")
         
-        # 构建查询提示
-        query_prompt = f"""
+        # 使用query_engine查询
+        response = query_engine.query(_build_dupont_query_prompt(company_name, year))
+        
+        # 解析响应
+        financial_data = parse_financial_data_response(_response_text(response))
+        
+        logger.info(f"财务数据提取成功: {len(financial_data)} 个指标")
+        
+        return financial_data
+        
+    except Exception as e:
+        logger.error(f"提取财务数据失败: {str(e)}")
+        # 返回示例数据以便测试
+        logger.warning("使用示例数据进行测试")
+        return dict(_SAMPLE_FINANCIAL_DATA)
+
+
+async def extract_financial_data_for_dupont_batch(
+    pairs: Sequence[Tuple[str, str]],
+    query_engine
+) -> List[Dict[str, float]]:
+    """
+    批量提取多个(公司, 年份)的杜邦分析财务数据
+    
+    各查询通过query_engine.aquery并发执行，总耗时接近单次查询而不是逐个累加。
+    单个查询失败时该项使用示例数据，与extract_financial_data_for_dupont一致。
+    
+    Args:
+        pairs: (公司名称, 年份) 列表
+        query_engine: LlamaIndex查询引擎
+        
+    Returns:
+        财务数据字典列表，顺序与pairs一致
+    """
+    logger.info(f"开始批量提取财务数据: {len(pairs)} 组")
+    
+    responses = await asyncio.gather(
+        *(query_engine.aquery(_build_dupont_query_prompt(company_name, year))
+          for company_name, year in pairs),
+        return_exceptions=True
+    )
+    
+    results = []
+    for (company_name, year), response in zip(pairs, responses):
+        if isinstance(response, Exception):
+            logger.error(f"提取财务数据失败: {company_name} - {year}: {str(response)}")
+            logger.warning("使用示例数据进行测试")
+            results.append(dict(_SAMPLE_FINANCIAL_DATA))
+        else:
+            results.append(parse_financial_data_response(_response_text(response)))
+    
+    return results
+
+
+def _response_text(response) -> str:
+    """
+    取出查询结果的回答文本
+    
+    LlamaIndex的Response对象直接提供.response字符串，无需经过__str__格式化；
+    其他类型（或.response为空）时回退到str(response)。
+    """
+    return getattr(response, 'response', None) or str(response)
+
+
+def _build_dupont_query_prompt(company_name: str, year: str) -> str:
+    """构建提取杜邦分析财务数据的查询提示"""
+    return f"""
         请从{company_name}{year}年度财务报表中提取以下指标的数值：
         
         1. 净利润（归属于母公司所有者的净利润）
@@ -105,85 +258,52 @@ def extract_financial_data_for_dupont(
         请以JSON格式返回，键名使用中文，值为数字（单位：元）。
         例如：{{"净利润": 1000000000, "营业收入": 5000000000, ...}}
         """
-        
-        # 使用query_engine查询
-        response = query_engine.query(query_prompt)
-        
-        # 解析响应
-        financial_data = parse_financial_data_response(str(response))
-        
-        logger.info(f"财务数据提取成功: {len(financial_data)} 个指标")
-        
-        return financial_data
-        
-    except Exception as e:
-        logger.error(f"提取财务数据失败: {str(e)}")
-        # 返回示例数据以便测试
-        logger.warning("使用示例数据进行测试")
-        return {
-            '净利润': 1000000000,  # 10亿
-            '营业收入': 5000000000,  # 50亿
-            '总资产': 10000000000,  # 100亿
-            '股东权益': 6000000000,  # 60亿
-            '流动资产': 4000000000,  # 40亿
-            '非流动资产': 6000000000,  # 60亿
-        }
 
 
 def parse_financial_data_response(response_text: str) -> Dict[str, float]:
     """
     解析query_engine的响应，提取财务数据
     
+    相同的响应文本（如重试时重复的查询结果）只解析一次，之后直接复用缓存结果。
+    
     Args:
         response_text: 响应文本
         
     Returns:
-        财务数据字典
+        财务数据字典（每次返回新的dict，调用方可自由修改）
     """
-    import json
-    import re
-    
+    return dict(_parse_financial_data_cached(response_text))
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_financial_data_cached(response_text: str) -> Tuple[Tuple[str, float], ...]:
+    """parse_financial_data_response的缓存实现，返回可哈希的(指标, 值)元组"""
+    return tuple(_parse_financial_data(response_text).items())
+
+
+def _parse_financial_data(response_text: str) -> Dict[str, float]:
+    """解析响应文本（无缓存）"""
     try:
-        # 尝试直接解析JSON
-        # 查找JSON块
-        json_match = re.search(r'\{[^{}]*\}', response_text)
-        if json_match:
-            json_str = json_match.group()
-            data = json.loads(json_str)
-            
-            # 转换为float
+        # 尝试直接解析JSON（支持嵌套对象）
+        data = _find_json_object(response_text)
+        if data is not None:
             financial_data = {}
-            for key, value in data.items():
-                if isinstance(value, (int, float)):
-                    financial_data[key] = float(value)
-                elif isinstance(value, str):
-                    # 尝试解析字符串中的数字
-                    value_clean = value.replace(',', '').replace('元', '').strip()
-                    try:
-                        financial_data[key] = float(value_clean)
-                    except ValueError:
-                        logger.warning(f"无法解析值: {key}={value}")
-            
-            return financial_data
+            _collect_numeric_values(data, financial_data)
+            if financial_data:
+                return financial_data
         
         # 如果没有找到JSON，尝试从文本中提取
         financial_data = {}
         
-        # 定义指标模式
-        patterns = {
-            '净利润': r'净利润[：:]\s*([\d,\.]+)',
-            '营业收入': r'营业收入[：:]\s*([\d,\.]+)',
-            '总资产': r'总资产[：:]\s*([\d,\.]+)',
-            '股东权益': r'股东权益[：:]\s*([\d,\.]+)',
-            '流动资产': r'流动资产[：:]\s*([\d,\.]+)',
-            '非流动资产': r'非流动资产[：:]\s*([\d,\.]+)',
-        }
-        
-        for metric_name, pattern in patterns.items():
-            match = re.search(pattern, response_text)
-            if match:
-                value_str = match.group(1).replace(',', '')
-                financial_data[metric_name] = float(value_str)
+        # 单次扫描文本，每个指标取第一次出现的值
+        for match in _METRIC_TEXT_RE.finditer(response_text):
+            metric_name = match.group(1)
+            if metric_name in financial_data:
+                continue
+            try:
+                financial_data[metric_name] = float(match.group(2).replace(',', ''))
+            except ValueError:
+                logger.warning(f"无法解析值: {metric_name}={match.group(2)}")
         
         return financial_data
         
@@ -192,13 +312,73 @@ def parse_financial_data_response(response_text: str) -> Dict[str, float]:
         return {}
 
 
+def _find_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    定位文本中第一个顶层JSON对象（括号平衡，支持嵌套）
+    
+    Args:
+        text: 响应文本
+        
+    Returns:
+        解析出的字典，找不到时返回None
+    """
+    start = text.find('{')
+    if start < 0:
+        return None
+    
+    # 快速路径：第一个'{'到最后一个'}'正好是完整JSON（纯JSON或```json代码块）
+    end = text.rfind('}')
+    if end > start:
+        try:
+            data = _json_loads(text[start:end + 1])
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+    
+    # 从每个'{'开始尝试解码，raw_decode会在对象结束处停下
+    while start >= 0:
+        try:
+            data, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+        start = text.find('{', start + 1)
+    
+    return None
+
+
+def _collect_numeric_values(data: Dict[str, Any], financial_data: Dict[str, float]) -> None:
+    """
+    将JSON对象中的数值（含"1,000元"形式的字符串）转换为float写入financial_data，
+    嵌套对象会被展开
+    """
+    for key, value in data.items():
+        if isinstance(value, dict):
+            _collect_numeric_values(value, financial_data)
+        elif isinstance(value, (int, float)):
+            financial_data[key] = float(value)
+        elif isinstance(value, str):
+            # 尝试解析字符串中的数字
+            value_clean = value.replace(',', '').replace('元', '').strip()
+            try:
+                financial_data[key] = float(value_clean)
+            except ValueError:
+                logger.warning(f"无法解析值: {key}={value}")
+
+
 def extract_financial_data_from_pdf_tables(
     pdf_path: str,
     company_name: str,
     year: str
 ) -> Dict[str, float]:
     """
-    从PDF表格中提取财务数据（使用pdfplumber）
+    从PDF表格中提取财务数据（优先使用PyMuPDF，未安装时使用pdfplumber）
+    
+    页数较多时按连续页段分给多个进程并行解析，结果按页序合并，
+    与串行逐页处理的结果一致。每个指标取第一次出现的值，
+    全部指标找齐后即停止扫描后续页。
     
     Args:
         pdf_path: PDF文件路径
@@ -209,32 +389,35 @@ def extract_financial_data_from_pdf_tables(
         财务数据字典
     """
     try:
-        import pdfplumber
-        import pandas as pd
-        
         logger.info(f"开始从PDF提取表格: {pdf_path}")
         
-        financial_data = {}
+        num_pages = _count_pdf_pages(pdf_path)
         
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # 提取表格
-                tables = page.extract_tables()
-                
-                if not tables:
-                    continue
-                
-                for table_num, table in enumerate(tables, 1):
-                    if not table or len(table) < 2:
-                        continue
-                    
-                    # 转换为DataFrame
-                    df = pd.DataFrame(table[1:], columns=table[0])
-                    
-                    # 查找财务指标
-                    financial_data.update(
-                        _extract_metrics_from_table(df, year)
-                    )
+        workers = min(os.cpu_count() or 1, num_pages)
+        
+        if num_pages <= _PARALLEL_PAGE_THRESHOLD or workers <= 1:
+            financial_data = _extract_metrics_from_pages(pdf_path, range(num_pages), year)
+        else:
+            # 每个进程只打开一次PDF，处理一段连续页
+            chunk_size = -(-num_pages // workers)
+            page_ranges = [
+                range(start, min(start + chunk_size, num_pages))
+                for start in range(0, num_pages, chunk_size)
+            ]
+            financial_data = {}
+            with ProcessPoolExecutor(max_workers=len(page_ranges)) as executor:
+                futures = [
+                    executor.submit(_extract_metrics_from_pages, pdf_path, page_range, year)
+                    for page_range in page_ranges
+                ]
+                for future in futures:
+                    # 前面页段的值优先
+                    for metric_name, value in future.result().items():
+                        financial_data.setdefault(metric_name, value)
+                    if _DUPONT_METRICS.issubset(financial_data):
+                        # 已找齐，取消尚未开始的页段
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        break
         
         logger.info(f"从PDF提取到 {len(financial_data)} 个指标")
         
@@ -245,6 +428,78 @@ def extract_financial_data_from_pdf_tables(
         return {}
 
 
+def _extract_metrics_from_pages(
+    pdf_path: str,
+    page_indices: Iterable[int],
+    year: str
+) -> Dict[str, float]:
+    """
+    扫描指定页的表格并提取财务指标（可在工作进程中运行）
+    
+    Args:
+        pdf_path: PDF文件路径
+        page_indices: 要处理的页索引（从0开始）
+        year: 年份
+        
+    Returns:
+        财务数据字典，每个指标取第一次出现的值；全部找齐后提前返回
+    """
+    import pandas as pd
+    
+    financial_data = {}
+    
+    for table in _iter_page_tables(pdf_path, page_indices):
+        if not table or len(table) < 2:
+            continue
+        
+        # 转换为DataFrame
+        df = pd.DataFrame(table[1:], columns=table[0])
+        
+        # 查找财务指标
+        for metric_name, value in _extract_metrics_from_table(df, year).items():
+            financial_data.setdefault(metric_name, value)
+        
+        if _DUPONT_METRICS.issubset(financial_data):
+            return financial_data
+    
+    return financial_data
+
+
+def _count_pdf_pages(pdf_path: str) -> int:
+    """获取PDF页数"""
+    try:
+        import fitz
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+    
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def _iter_page_tables(pdf_path: str, page_indices: Iterable[int]) -> Iterator[List[List[Any]]]:
+    """
+    按页序逐个产出指定页中的表格（行列表，第一行为表头）
+    
+    PyMuPDF的表格检测在C扩展中完成，明显快于纯Python的pdfplumber；
+    未安装PyMuPDF时回退到pdfplumber。两者使用相同的线条检测参数。
+    """
+    try:
+        import fitz
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_idx in page_indices:
+                yield from pdf.pages[page_idx].extract_tables(table_settings=_TABLE_SETTINGS)
+        return
+    
+    with fitz.open(pdf_path) as doc:
+        for page_idx in page_indices:
+            for table in doc[page_idx].find_tables(**_TABLE_SETTINGS):
+                yield table.extract()
+
+
 def _extract_metrics_from_table(df: 'pd.DataFrame', year: str) -> Dict[str, float]:
     """
     从DataFrame中提取财务指标
@@ -257,39 +512,33 @@ def _extract_metrics_from_table(df: 'pd.DataFrame', year: str) -> Dict[str, floa
         提取的指标字典
     """
     import pandas as pd
-    import re
     
     metrics = {}
     
-    # 定义要查找的指标
-    metric_keywords = {
-        '净利润': ['净利润', '归属于母公司', '归母净利润'],
-        '营业收入': ['营业收入', '营业总收入', '主营业务收入'],
-        '总资产': ['总资产', '资产总计', '资产合计'],
-        '股东权益': ['股东权益', '所有者权益', '归属于母公司所有者权益'],
-        '流动资产': ['流动资产', '流动资产合计'],
-        '非流动资产': ['非流动资产', '非流动资产合计'],
-    }
-    
-    # 遍历DataFrame查找指标
-    for metric_name, keywords in metric_keywords.items():
-        for idx, row in df.iterrows():
-            # 检查第一列是否包含关键词
-            first_col = str(row.iloc[0]) if len(row) > 0 else ""
-            
-            if any(keyword in first_col for keyword in keywords):
-                # 查找包含年份的列
-                for col in df.columns:
-                    if year in str(col):
-                        value_str = str(row[col])
-                        # 提取数字
-                        value_clean = re.sub(r'[^\d\.\-]', '', value_str)
-                        try:
-                            metrics[metric_name] = float(value_clean)
-                            break
-                        except ValueError:
-                            continue
-                break
+    if df.empty or df.shape[1] == 0:
+        return metrics
+    
+    # 包含年份的列（按位置取，兼容重复或为空的表头）
+    year_positions = [i for i, col in enumerate(df.columns) if year in str(col)]
+    if not year_positions:
+        return metrics
+    
+    # 第一列作为指标名称列，整列一次性转为字符串
+    first_col = df.iloc[:, 0].astype(str)
+    
+    for metric_name, pattern in _METRIC_ROW_PATTERNS.items():
+        # 第一个名称匹配关键词的行
+        mask = first_col.str.contains(pattern, na=False).to_numpy()
+        if not mask.any():
+            continue
+        
+        # 取该行年份列中第一个能解析为数字的值
+        cells = df.iloc[int(mask.argmax()), year_positions].astype(str)
+        values = pd.to_numeric(
+            cells.str.replace(_NON_NUMERIC_RE, '', regex=True),
+            errors='coerce'
+        ).dropna()
+        if not values.empty:
+            metrics[metric_name] = float(values.iloc[0])
     
     return metrics
-
@@ -3,39 +3,385 @@
 使用 FunctionAgent 协调各个工具生成完整报告
 """
 
+import asyncio
+import functools
+import inspect
+import json
 import logging
-from typing import Dict, Any, Optional
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from llama_index.core.agent.workflow import FunctionAgent
 from llama_index.core.tools import FunctionTool, QueryEngineTool
 from llama_index.core import Settings
 from llama_index.core.llms import ChatMessage
-from models.report_models import AnnualReportAnalysis
 from agents.report_tools import (
     generate_financial_review,
     generate_business_guidance,
     generate_business_highlights,
     generate_profit_forecast_and_valuation,
+    generate_comprehensive_analysis,
+    generate_annual_report_analysis,
     retrieve_financial_data,
     retrieve_business_data
 )
 from agents.visualization_agent import generate_visualization_for_query
 from agents.dupont_tools import generate_dupont_analysis
+from agents.template_renderer import render_annual_report
+from core.llm_limiter import call_llm
+from core.section_cache import MISSING, SectionCache
+from core.semantic_cache import extract_guard_tokens
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，缺失时使用纯Python递归序列化
+    orjson = None
+
+# orjson>=3.10 可将已编码的 JSON 原样嵌入输出(可视化工具返回的就是 JSON 字符串)
+_JSON_FRAGMENT = getattr(orjson, "Fragment", None)
 
 logger = logging.getLogger(__name__)
 
+# Agent 系统提示词(模块加载时创建一次, 所有 Agent 共用)
+SYSTEM_PROMPT = """
+你是一个专业的年报分析 Agent,负责生成结构化的年报分析报告。
+
+你的任务是:
+1. 理解用户的年报分析需求
+2. 使用提供的工具检索和分析年报数据
+3. 按照标准模板生成完整的年报分析报告
+4. 在适当的时候生成可视化图表以增强洞察
+5. 当用户需要深入分析盈利能力时，使用杜邦分析工具进行ROE分解
+6. 当用户需要对公司进行综合分析时，使用 generate_comprehensive_analysis 工具一次获取并分析全部数据
+
+报告结构包括五个部分:
+一、财务点评 (使用 generate_financial_review 工具)
+二、业绩指引 (使用 generate_business_guidance 工具)
+三、业务亮点 (使用 generate_business_highlights 工具)
+四、盈利预测和估值 (使用 generate_profit_forecast_and_valuation 工具)
+五、总结 (基于前四部分综合生成)
+
+工作流程:
+1. 首先使用 annual_report_query 工具了解年报的基本信息(公司名称、年份等)
+2. 依次调用各章节生成工具
+3. 对于包含数值数据的回答，使用 generate_visualization 工具生成图表
+4. 最后综合所有章节生成总结
+
+可视化使用指南:
+- 当回答包含趋势数据时，生成折线图或面积图
+- 当回答包含对比数据时，生成柱状图
+- 当回答包含占比数据时，生成饼图
+- 财务指标对比适合使用分组柱状图
+- 时间序列数据适合使用折线图
+
+注意事项:
+- 确保所有数据来源于年报原文
+- 保持分析的客观性和专业性
+- 使用结构化的格式输出
+- 如果某些数据缺失,明确说明
+- 适时使用可视化增强数据表达
+"""
+
+# 互不依赖、可并发生成的四个章节: 结构化报告中的字段名 -> (章节名称, 生成函数)
+REPORT_SECTIONS = {
+    "financial_review": ("财务点评", generate_financial_review),
+    "business_guidance": ("业绩指引", generate_business_guidance),
+    "business_highlights": ("业务亮点", generate_business_highlights),
+    "profit_forecast_and_valuation": ("盈利预测和估值", generate_profit_forecast_and_valuation),
+}
+
+# 完整报告的 Markdown 模板目录
+_TEMPLATE_DIR = str(Path(__file__).resolve().parent.parent / "templates")
+
+# generate_section 使用的章节名称 -> 生成函数
+SECTION_FN_MAP = {
+    "financial_review": generate_financial_review,
+    "business_guidance": generate_business_guidance,
+    "business_highlights": generate_business_highlights,
+    "profit_forecast": generate_profit_forecast_and_valuation,
+}
+
+# Agent 的函数工具: (函数, 工具名, 描述, 是否绑定 query_engine)
+TOOL_SPECS = (
+    (generate_financial_review, "generate_financial_review", (
+        "生成财务点评章节。"
+        "需要参数: company_name(公司名称), year(年份)。"
+        "返回包含财务图表、业绩速览、业绩对比、指标归因的结构化数据。"
+    ), True),
+    (generate_business_guidance, "generate_business_guidance", (
+        "生成业绩指引章节。"
+        "需要参数: company_name(公司名称), year(年份)。"
+        "返回包含业绩预告、经营计划、风险提示的结构化数据。"
+    ), True),
+    (generate_business_highlights, "generate_business_highlights", (
+        "生成业务亮点章节。"
+        "需要参数: company_name(公司名称), year(年份)。"
+        "返回各业务板块的亮点和成就。"
+    ), True),
+    (generate_profit_forecast_and_valuation, "generate_profit_forecast_and_valuation", (
+        "生成盈利预测和估值章节。"
+        "需要参数: company_name(公司名称), year(年份)。"
+        "返回一致预测、机构预测、估值分析的结构化数据。"
+    ), True),
+    (retrieve_financial_data, "retrieve_financial_data", (
+        "检索特定的财务数据。"
+        "需要参数: company_name(公司名称), year(年份), "
+        "metric_type(指标类型: revenue/profit/cash_flow/balance_sheet)。"
+    ), True),
+    (retrieve_business_data, "retrieve_business_data", (
+        "检索业务相关数据。"
+        "需要参数: company_name(公司名称), year(年份), business_type(业务类型)。"
+    ), True),
+    (generate_visualization_for_query, "generate_visualization", (
+        "为查询和回答生成可视化图表。"
+        "需要参数: query(用户查询), answer(文本回答)。"
+        "可选参数: data(原始数据), sources(数据来源)。"
+        "返回包含图表配置的可视化响应。"
+    ), False),
+    (generate_dupont_analysis, "generate_dupont_analysis", (
+        "生成杜邦分析报告。"
+        "杜邦分析将净资产收益率(ROE)分解为资产净利率、资产周转率和权益乘数，"
+        "帮助深入理解公司盈利能力的驱动因素。"
+        "需要参数: company_name(公司名称), year(年份)。"
+        "返回包含ROE分解、各层级指标、可视化图表的结构化数据。"
+    ), True),
+    (generate_comprehensive_analysis, "generate_comprehensive_analysis", (
+        "生成公司综合分析。"
+        "并发检索收入、利润、现金流、资产负债和主营业务数据后统一分析。"
+        "需要参数: company_name(公司名称), year(年份)。"
+        "返回综合分析文本。"
+    ), True),
+)
+
+# 单次查询的上限: 防止 LLM 反复调用工具导致查询无限运行
+QUERY_TIMEOUT_SECONDS = 120
+MAX_TOOL_CALLS = 20
+
+# 同步工具(检索、杜邦分析)在共享线程池中执行, 避免阻塞事件循环
+_TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="report-tool")
+
+
+def _run_in_tool_executor(fn):
+    """
+    将同步工具函数包装为协程函数, 供 FunctionTool 的 async_fn 使用
+    
+    Args:
+        fn: 同步函数(通常是绑定了 query_engine 的 partial)
+    
+    Returns:
+        在 _TOOL_EXECUTOR 中执行 fn 的协程函数
+    """
+    async def _arun(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_TOOL_EXECUTOR, partial(fn, *args, **kwargs))
+    return _arun
+
+# _get_section_cache 创建的全部章节缓存, 索引变化时由 clear_section_caches 统一清空
+_SECTION_CACHES: "weakref.WeakSet[SectionCache]" = weakref.WeakSet()
+
+
+@functools.lru_cache(maxsize=32)
+def _get_section_cache(query_engine, section_store=None) -> SectionCache:
+    """
+    获取 query_engine 对应的章节缓存(同一查询引擎上的 ReportAgent 与工具共享)
+    
+    Args:
+        query_engine: LlamaIndex 查询引擎
+        section_store: 可选的持久化存储(SQLite / Redis), 见 core.section_cache.create_section_store
+    """
+    cache = SectionCache(store=section_store)
+    _SECTION_CACHES.add(cache)
+    return cache
+
+
+def clear_section_caches(section_store=None) -> None:
+    """
+    清空全部章节缓存(包括持久化存储)
+    
+    章节缓存的键只有 (章节函数名, 公司名称, 年份), 不包含索引信息,
+    索引构建或重建后必须调用, 否则会返回基于旧文档生成的章节。
+    
+    Args:
+        section_store: 持久化存储; 尚未创建任何章节缓存时也会被清空
+    """
+    for cache in list(_SECTION_CACHES):
+        cache.clear()
+    if section_store is not None:
+        section_store.clear()
+
+
+# 章节生成函数(在 Agent 工具中加上章节缓存)
+_SECTION_FNS = frozenset(fn for _, fn in REPORT_SECTIONS.values())
+
+
+def _cached_section(fn, cache: SectionCache):
+    """
+    为章节生成函数加上缓存, 只缓存成功的结果
+    
+    Args:
+        fn: 章节生成协程函数, 签名为 (company_name, year, query_engine)
+        cache: 章节缓存
+    
+    Returns:
+        带缓存的协程函数(保留原函数签名, 供 FunctionTool 解析参数)
+    """
+    @functools.wraps(fn)
+    async def _wrapper(company_name, year, query_engine):
+        key = (fn.__name__, company_name, year)
+        result = cache.get(key)
+        if result is MISSING:
+            result = await fn(company_name, year, query_engine=query_engine)
+            cache.set(key, result)
+        else:
+            logger.info(f"✅ 章节缓存命中: {fn.__name__} {company_name} {year}")
+        return result
+    return _wrapper
+
+
+def _wrap_tool_fn(fn, query_engine, section_cache: SectionCache):
+    """
+    工具函数的统一包装(缓存、线程池等横切逻辑集中在这里)
+    
+    - 章节生成函数: 加上章节缓存
+    - 传入 query_engine 时: 用 partial 绑定
+    - 同步函数: 额外提供在 _TOOL_EXECUTOR 中执行的 async_fn
+    
+    Args:
+        fn: TOOL_SPECS 中的工具函数
+        query_engine: 需要绑定的查询引擎, 不需要时为 None
+        section_cache: 章节缓存
+    
+    Returns:
+        (fn, async_fn) 元组, 供 FunctionTool.from_defaults 使用
+    """
+    if fn in _SECTION_FNS:
+        fn = _cached_section(fn, section_cache)
+    if query_engine is not None:
+        fn = partial(fn, query_engine=query_engine)
+    if inspect.iscoroutinefunction(fn):
+        return fn, None
+    return fn, _run_in_tool_executor(fn)
+
+
+@functools.lru_cache(maxsize=32)
+def _build_tools(query_engine, section_store=None) -> Tuple[Any, ...]:
+    """
+    创建 Agent 使用的全部工具
+    
+    FunctionTool.from_defaults 会对每个函数做签名解析并生成参数模型,
+    因此按 query_engine 缓存: 同一查询引擎上创建的多个 ReportAgent 复用同一组工具。
+    
+    Args:
+        query_engine: LlamaIndex 查询引擎
+        section_store: 章节缓存的持久化存储(可选)
+    
+    Returns:
+        工具元组
+    """
+    # 1. 创建 QueryEngineTool (用于基础数据检索)
+    query_tool = QueryEngineTool.from_defaults(
+        query_engine=query_engine,
+        name="annual_report_query",
+        description=(
+            "用于从年报中检索基础信息的工具。"
+            "可以查询财务数据、业务数据、公司信息等。"
+            "输入应该是一个自然语言查询。"
+        )
+    )
+    
+    # 2. 按 TOOL_SPECS 创建其余工具
+    section_cache = _get_section_cache(query_engine, section_store)
+    function_tools = []
+    for fn, name, description, needs_query_engine in TOOL_SPECS:
+        sync_fn, async_fn = _wrap_tool_fn(fn, query_engine if needs_query_engine else None, section_cache)
+        function_tools.append(FunctionTool.from_defaults(
+            fn=sync_fn,
+            async_fn=async_fn,
+            name=name,
+            description=description
+        ))
+    
+    return (query_tool, *function_tools)
+
+
+@functools.lru_cache(maxsize=32)
+def _create_agent(query_engine, section_store=None) -> FunctionAgent:
+    """按 query_engine 缓存的 FunctionAgent, 使用创建时的 Settings.llm(由 _build_agent 调用)"""
+    return FunctionAgent(
+        tools=list(_build_tools(query_engine, section_store)),
+        llm=Settings.llm,
+        system_prompt=SYSTEM_PROMPT,
+        name="annual_report_analyst",
+        verbose=True
+    )
+
+
+# _create_agent 缓存中的 FunctionAgent 所使用的 Settings.llm
+_AGENT_LLM_OWNER = None
+
+
+def _build_agent(query_engine, section_store=None) -> FunctionAgent:
+    """
+    获取 FunctionAgent
+    
+    Agent 本身不保存运行状态(每次 run 都有独立的上下文), 因此按 query_engine 缓存,
+    同一查询引擎上创建的多个 ReportAgent 共享同一个 FunctionAgent。
+    LLM 对象不可哈希, 无法作为缓存键, 与 _sllm 一样在 Settings.llm 被替换时清空缓存。
+    
+    Args:
+        query_engine: LlamaIndex 查询引擎
+        section_store: 章节缓存的持久化存储(可选)
+    
+    Returns:
+        FunctionAgent 实例
+    """
+    global _AGENT_LLM_OWNER
+    llm = Settings.llm
+    if llm is not _AGENT_LLM_OWNER:
+        _create_agent.cache_clear()
+        _AGENT_LLM_OWNER = llm
+    return _create_agent(query_engine, section_store)
+
+
+def _orjson_default(obj) -> Any:
+    """orjson 无法直接序列化的对象: Pydantic 模型转 dict, 普通对象取公开属性, 其余转字符串"""
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    if hasattr(obj, 'dict'):
+        return obj.dict()
+    if hasattr(obj, '__dict__'):
+        return {k: v for k, v in obj.__dict__.items() if not k.startswith('_')}
+    return str(obj)
+
 
 class ReportAgent:
     """年报分析 Agent"""
 
-    def __init__(self, query_engine):
+    def __init__(self, query_engine, section_store=None, query_cache=None, embed_fn=None, fast_fallback=True):
         """
         初始化 Agent
 
         Args:
             query_engine: LlamaIndex 查询引擎
+            section_store: 章节缓存的持久化存储(可选), 不传时仅使用进程内缓存
+            query_cache: query_json 使用的语义缓存(可选, 见 core.semantic_cache.SemanticLSHCache)
+            embed_fn: 计算问题向量的协程函数(使用 query_cache 时需要), 如 RAGEngine.aembed
+            fast_fallback: generate_report_fast 的单次调用失败时是否退回逐章节生成
         """
         self.query_engine = query_engine
-        self.agent = None
+        self.section_store = section_store
+        self.query_cache = query_cache
+        self.embed_fn = embed_fn
+        self.fast_fallback = fast_fallback
+        # generate_report_fast 各路径的次数: 单次调用成功/失败、退回逐章节生成、章节全部命中缓存
+        self.fast_report_stats = {"single_call": 0, "single_call_failed": 0, "fallback": 0, "cached": 0}
+        self._section_cache = _get_section_cache(query_engine, section_store)
+        # 正在执行的查询: 问题(query_json 为 ("json", 问题)) -> Task, 并发的相同问题共享一次 Agent 运行
+        self._inflight_queries: Dict[Any, asyncio.Task] = {}
         self._setup_agent()
 
     def _serialize_tool_output(self, tool_output) -> Any:
@@ -48,6 +394,17 @@ class ReportAgent:
         Returns:
             可序列化的数据（dict, str, list等）
         """
+        # 快速路径: 由 orjson 在C层面遍历整个结构
+        if orjson is not None:
+            try:
+                return orjson.loads(orjson.dumps(
+                    tool_output,
+                    default=_orjson_default,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                ))
+            except TypeError as e:
+                logger.debug(f"orjson serialization failed, falling back: {str(e)}")
+        
         try:
             # 如果是字符串、数字、布尔值、None，直接返回
             if isinstance(tool_output, (str, int, float, bool, type(None))):
@@ -89,168 +446,15 @@ class ReportAgent:
             logger.warning(f"Failed to serialize tool_output: {str(e)}, converting to string")
             return str(tool_output)
     
+    @property
+    def agent(self) -> FunctionAgent:
+        """当前 Settings.llm 对应的 FunctionAgent(见 _build_agent)"""
+        return _build_agent(self.query_engine, self.section_store)
+    
     def _setup_agent(self):
-        """设置 Agent 和工具"""
+        """设置 Agent 和工具(预先创建, 首次查询不再承担创建开销)"""
         try:
-            # 1. 创建 QueryEngineTool (用于基础数据检索)
-            query_tool = QueryEngineTool.from_defaults(
-                query_engine=self.query_engine,
-                name="annual_report_query",
-                description=(
-                    "用于从年报中检索基础信息的工具。"
-                    "可以查询财务数据、业务数据、公司信息等。"
-                    "输入应该是一个自然语言查询。"
-                )
-            )
-            
-            # 2. 创建专门的章节生成工具
-            # 注意: 这些工具需要 query_engine 参数,我们使用 partial 来绑定
-            from functools import partial
-            
-            financial_review_tool = FunctionTool.from_defaults(
-                fn=partial(generate_financial_review, query_engine=self.query_engine),
-                name="generate_financial_review",
-                description=(
-                    "生成财务点评章节。"
-                    "需要参数: company_name(公司名称), year(年份)。"
-                    "返回包含财务图表、业绩速览、业绩对比、指标归因的结构化数据。"
-                )
-            )
-            
-            business_guidance_tool = FunctionTool.from_defaults(
-                fn=partial(generate_business_guidance, query_engine=self.query_engine),
-                name="generate_business_guidance",
-                description=(
-                    "生成业绩指引章节。"
-                    "需要参数: company_name(公司名称), year(年份)。"
-                    "返回包含业绩预告、经营计划、风险提示的结构化数据。"
-                )
-            )
-            
-            business_highlights_tool = FunctionTool.from_defaults(
-                fn=partial(generate_business_highlights, query_engine=self.query_engine),
-                name="generate_business_highlights",
-                description=(
-                    "生成业务亮点章节。"
-                    "需要参数: company_name(公司名称), year(年份)。"
-                    "返回各业务板块的亮点和成就。"
-                )
-            )
-            
-            profit_forecast_tool = FunctionTool.from_defaults(
-                fn=partial(generate_profit_forecast_and_valuation, query_engine=self.query_engine),
-                name="generate_profit_forecast_and_valuation",
-                description=(
-                    "生成盈利预测和估值章节。"
-                    "需要参数: company_name(公司名称), year(年份)。"
-                    "返回一致预测、机构预测、估值分析的结构化数据。"
-                )
-            )
-            
-            # 3. 创建数据检索辅助工具
-            financial_data_tool = FunctionTool.from_defaults(
-                fn=partial(retrieve_financial_data, query_engine=self.query_engine),
-                name="retrieve_financial_data",
-                description=(
-                    "检索特定的财务数据。"
-                    "需要参数: company_name(公司名称), year(年份), "
-                    "metric_type(指标类型: revenue/profit/cash_flow/balance_sheet)。"
-                )
-            )
-            
-            business_data_tool = FunctionTool.from_defaults(
-                fn=partial(retrieve_business_data, query_engine=self.query_engine),
-                name="retrieve_business_data",
-                description=(
-                    "检索业务相关数据。"
-                    "需要参数: company_name(公司名称), year(年份), business_type(业务类型)。"
-                )
-            )
-
-            # 可视化生成工具
-            visualization_tool = FunctionTool.from_defaults(
-                fn=generate_visualization_for_query,
-                name="generate_visualization",
-                description=(
-                    "为查询和回答生成可视化图表。"
-                    "需要参数: query(用户查询), answer(文本回答)。"
-                    "可选参数: data(原始数据), sources(数据来源)。"
-                    "返回包含图表配置的可视化响应。"
-                )
-            )
-
-            # 杜邦分析工具（新增）
-            dupont_analysis_tool = FunctionTool.from_defaults(
-                fn=partial(generate_dupont_analysis, query_engine=self.query_engine),
-                name="generate_dupont_analysis",
-                description=(
-                    "生成杜邦分析报告。"
-                    "杜邦分析将净资产收益率(ROE)分解为资产净利率、资产周转率和权益乘数，"
-                    "帮助深入理解公司盈利能力的驱动因素。"
-                    "需要参数: company_name(公司名称), year(年份)。"
-                    "返回包含ROE分解、各层级指标、可视化图表的结构化数据。"
-                )
-            )
-
-            # 4. 组装所有工具
-            tools = [
-                query_tool,
-                financial_review_tool,
-                business_guidance_tool,
-                business_highlights_tool,
-                profit_forecast_tool,
-                financial_data_tool,
-                business_data_tool,
-                visualization_tool,  # 可视化工具
-                dupont_analysis_tool  # 杜邦分析工具（新增）
-            ]
-            
-            # 5. 创建 FunctionAgent
-            system_prompt = """
-你是一个专业的年报分析 Agent,负责生成结构化的年报分析报告。
-
-你的任务是:
-1. 理解用户的年报分析需求
-2. 使用提供的工具检索和分析年报数据
-3. 按照标准模板生成完整的年报分析报告
-4. 在适当的时候生成可视化图表以增强洞察
-5. 当用户需要深入分析盈利能力时，使用杜邦分析工具进行ROE分解
-
-报告结构包括五个部分:
-一、财务点评 (使用 generate_financial_review 工具)
-二、业绩指引 (使用 generate_business_guidance 工具)
-三、业务亮点 (使用 generate_business_highlights 工具)
-四、盈利预测和估值 (使用 generate_profit_forecast_and_valuation 工具)
-五、总结 (基于前四部分综合生成)
-
-工作流程:
-1. 首先使用 annual_report_query 工具了解年报的基本信息(公司名称、年份等)
-2. 依次调用各章节生成工具
-3. 对于包含数值数据的回答，使用 generate_visualization 工具生成图表
-4. 最后综合所有章节生成总结
-
-可视化使用指南:
-- 当回答包含趋势数据时，生成折线图或面积图
-- 当回答包含对比数据时，生成柱状图
-- 当回答包含占比数据时，生成饼图
-- 财务指标对比适合使用分组柱状图
-- 时间序列数据适合使用折线图
-
-注意事项:
-- 确保所有数据来源于年报原文
-- 保持分析的客观性和专业性
-- 使用结构化的格式输出
-- 如果某些数据缺失,明确说明
-- 适时使用可视化增强数据表达
-"""
-            
-            self.agent = FunctionAgent(
-                tools=tools,
-                llm=Settings.llm,
-                system_prompt=system_prompt,
-                name="annual_report_analyst",
-                verbose=True
-            )
+            _build_agent(self.query_engine, self.section_store)
             
             logger.info("✅ ReportAgent 初始化成功")
             
@@ -267,6 +471,9 @@ class ReportAgent:
         """
         生成完整的年报分析报告
         
+        未提供自定义查询时走 generate_report_fast(单次调用生成全部章节, 失败时逐章节并发生成);
+        提供自定义查询时由 Agent 自主规划工具调用。
+        
         Args:
             company_name: 公司名称
             year: 年份
@@ -275,17 +482,14 @@ class ReportAgent:
         Returns:
             完整的年报分析报告
         """
+        if not user_query:
+            return await self.generate_report_fast(company_name, year)
+        
         try:
             logger.info(f"开始生成年报分析: {company_name} {year}年")
             
-            # 构建查询
-            if user_query:
-                query = user_query
-            else:
-                query = f"请生成{company_name} {year}年的完整年报分析报告,包括财务点评、业绩指引、业务亮点、盈利预测和估值、以及总结。"
-            
             # 运行 Agent
-            response = await self.agent.run(query)
+            response = await self.agent.run(user_query)
             
             logger.info(f"✅ 年报分析生成成功")
             
@@ -306,6 +510,220 @@ class ReportAgent:
                 "year": year
             }
     
+    async def generate_report_fast(
+        self,
+        company_name: str,
+        year: str
+    ) -> Dict[str, Any]:
+        """
+        快速生成完整的年报分析报告
+        
+        优先用一次结构化输出调用生成全部章节和总结(见 generate_annual_report_analysis),
+        生成的章节写入章节缓存; 四个章节均已缓存时直接复用缓存。
+        单次调用失败(如输出未通过 AnnualReportAnalysis 校验)时, 退回逐章节并发生成,
+        最后只用一次 LLM 调用基于四个章节生成总结; 这会使 LLM 成本和耗时约翻倍,
+        fast_fallback 为 False 时不退回, 直接返回错误。各路径的次数记录在 fast_report_stats。
+        generate_report 在没有自定义查询时使用此路径。
+        
+        Args:
+            company_name: 公司名称
+            year: 年份
+        
+        Returns:
+            完整的年报分析报告, structured_response 与 AnnualReportAnalysis 结构一致
+        """
+        try:
+            logger.info(f"开始生成年报分析: {company_name} {year}年")
+            
+            section_keys = {
+                field: (fn.__name__, company_name, year)
+                for field, (_, fn) in REPORT_SECTIONS.items()
+            }
+            stats = self.fast_report_stats
+            if any(self._section_cache.get(key) is MISSING for key in section_keys.values()):
+                started = time.perf_counter()
+                try:
+                    report = await generate_annual_report_analysis(
+                        company_name, year, query_engine=self.query_engine
+                    )
+                except Exception as e:
+                    stats["single_call_failed"] += 1
+                    elapsed = time.perf_counter() - started
+                    if not self.fast_fallback:
+                        raise
+                    stats["fallback"] += 1
+                    # 单次调用的开销已经作废, 逐章节生成还需五次 LLM 调用
+                    logger.warning(
+                        f"⚠️ 单次生成年报分析失败(耗时 {elapsed:.1f}s), 改为逐章节生成: {str(e)} "
+                        f"[单次调用失败 {stats['single_call_failed']} 次, 退回逐章节 {stats['fallback']} 次]"
+                    )
+                else:
+                    stats["single_call"] += 1
+                    for field, key in section_keys.items():
+                        self._section_cache.set(key, report[field])
+                    
+                    logger.info(f"✅ 年报分析生成成功")
+                    return self._report_result(company_name, year, report, [])
+            else:
+                stats["cached"] += 1
+            
+            results = await asyncio.gather(
+                *(_cached_section(fn, self._section_cache)(
+                    company_name, year, query_engine=self.query_engine
+                  ) for _, fn in REPORT_SECTIONS.values()),
+                return_exceptions=True
+            )
+            
+            sections = {}
+            failed_sections = []
+            for field, result in zip(REPORT_SECTIONS, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"❌ 章节生成失败: {field}: {str(result)}")
+                    failed_sections.append(field)
+                else:
+                    sections[field] = result
+            
+            if not sections:
+                raise RuntimeError("所有章节均生成失败")
+            
+            overall_summary = await self._generate_summary(company_name, year, sections)
+            
+            logger.info(f"✅ 年报分析生成成功")
+            
+            report = {
+                "company_name": company_name,
+                "report_year": year,
+                "generation_date": datetime.now().strftime("%Y-%m-%d"),
+                **sections,
+                "overall_summary": overall_summary
+            }
+            return self._report_result(company_name, year, report, failed_sections)
+            
+        except Exception as e:
+            logger.error(f"❌ 生成年报分析失败: {str(e)}")
+            return {
+                "status": "error",
+                "error": str(e),
+                "company_name": company_name,
+                "year": year
+            }
+    
+    def _report_result(
+        self,
+        company_name: str,
+        year: str,
+        report: Dict[str, Any],
+        failed_sections: List[str]
+    ) -> Dict[str, Any]:
+        """
+        组装 generate_report_fast 的返回结果
+        
+        report 为完整的 Markdown 报告, summary 为其中的"五、总结"
+        """
+        return {
+            "status": "success",
+            "company_name": company_name,
+            "year": year,
+            "report": self._render_report(report),
+            "summary": report["overall_summary"],
+            "structured_response": report,
+            "failed_sections": failed_sections
+        }
+    
+    @staticmethod
+    def _render_report(report: Dict[str, Any]) -> str:
+        """
+        将结构化报告渲染为完整的 Markdown 报告(使用报告模板)
+        
+        模板渲染失败(如部分章节生成失败)时, 退回按章节拼接
+        """
+        try:
+            return render_annual_report(report, template_dir=_TEMPLATE_DIR)
+        except Exception as e:
+            logger.warning(f"⚠️ 报告模板渲染失败, 按章节拼接报告: {str(e)}")
+        
+        parts = [f"# {report['company_name']} {report['report_year']}年年报业绩点评"]
+        for field, (title, _) in REPORT_SECTIONS.items():
+            if field in report:
+                content = json.dumps(report[field], ensure_ascii=False, indent=2)
+                parts.append(f"## {title}\n\n```json\n{content}\n```")
+        parts.append(f"## 总结\n\n{report['overall_summary']}")
+        return "\n\n".join(parts)
+    
+    async def _generate_summary(
+        self,
+        company_name: str,
+        year: str,
+        sections: Dict[str, Any]
+    ) -> str:
+        """
+        基于已生成的章节生成"五、总结"
+        
+        Args:
+            company_name: 公司名称
+            year: 年份
+            sections: 结构化报告字段名 -> 章节内容
+        
+        Returns:
+            总结文本
+        """
+        sections_text = "\n\n".join(
+            f"{REPORT_SECTIONS[field][0]}:\n{json.dumps(content, ensure_ascii=False)}"
+            for field, content in sections.items()
+        )
+        
+        prompt = f"""
+基于以下已生成的章节,撰写{company_name} {year}年年报分析报告的总结部分。
+
+{sections_text}
+
+请综合各章节的要点,给出客观、专业的总结,直接输出总结正文。
+"""
+        
+        response = await call_llm(Settings.llm.achat, [
+            ChatMessage(role="system", content="你是一个专业的财务分析师,擅长撰写年报分析总结。"),
+            ChatMessage(role="user", content=prompt)
+        ])
+        
+        return response.message.content
+    
+    async def comprehensive_analysis(
+        self,
+        company_name: str,
+        year: str
+    ) -> Dict[str, Any]:
+        """
+        生成综合分析
+        
+        各项数据并发检索后由一次 LLM 调用完成综合分析, 不经过 Agent 逐步规划。
+        
+        Args:
+            company_name: 公司名称
+            year: 年份
+        
+        Returns:
+            综合分析结果
+        """
+        try:
+            analysis = await generate_comprehensive_analysis(
+                company_name, year, query_engine=self.query_engine
+            )
+            return {
+                "status": "success",
+                "company_name": company_name,
+                "year": year,
+                "analysis": analysis
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ 生成综合分析失败: {str(e)}")
+            return {
+                "status": "error",
+                "error": str(e),
+                "company_name": company_name,
+                "year": year
+            }
+    
     async def generate_section(
         self,
         section_name: str,
@@ -326,25 +744,22 @@ class ReportAgent:
         try:
             logger.info(f"开始生成章节: {section_name}")
             
-            section_map = {
-                "financial_review": "财务点评",
-                "business_guidance": "业绩指引",
-                "business_highlights": "业务亮点",
-                "profit_forecast": "盈利预测和估值"
-            }
+            fn = SECTION_FN_MAP.get(section_name)
+            if fn is None:
+                raise ValueError(f"无效的章节名称: {section_name}。有效值: {', '.join(SECTION_FN_MAP)}")
             
-            section_chinese = section_map.get(section_name, section_name)
-            query = f"请生成{company_name} {year}年的{section_chinese}章节。"
-            
-            response = await self.agent.run(query)
+            # 章节与生成函数一一对应, 直接调用(带缓存), 不经过 Agent 规划
+            section = await _cached_section(fn, self._section_cache)(
+                company_name, year, query_engine=self.query_engine
+            )
             
             logger.info(f"✅ 章节生成成功: {section_name}")
             
             return {
                 "status": "success",
                 "section_name": section_name,
-                "content": str(response),
-                "structured_response": response.structured_response if hasattr(response, 'structured_response') else None
+                "content": json.dumps(section, ensure_ascii=False, indent=2),
+                "structured_response": section
             }
             
         except Exception as e:
@@ -355,81 +770,199 @@ class ReportAgent:
                 "section_name": section_name
             }
     
-    async def query(self, question: str) -> Dict[str, Any]:
+    async def query(
+        self,
+        question: str,
+        timeout_s: float = QUERY_TIMEOUT_SECONDS,
+        max_tool_calls: int = MAX_TOOL_CALLS
+    ) -> Dict[str, Any]:
         """
         通用查询接口
 
+        同一问题的并发请求(如重复点击、多个标签页)合并为一次 Agent 运行,
+        所有调用方拿到同一个结果(使用第一个请求的上限参数)。
+
         Args:
             question: 用户问题
+            timeout_s: 查询超时时间(秒)
+            max_tool_calls: 最多允许的工具调用次数
 
         Returns:
-            查询结果（包含可视化数据）
+            查询结果（包含可视化数据）, 超时或工具调用次数超限时 status 为 partial
+        """
+        return await self._coalesce(
+            question,
+            partial(self._do_query, question, timeout_s, max_tool_calls)
+        )
+
+    async def query_json(
+        self,
+        question: str,
+        timeout_s: float = QUERY_TIMEOUT_SECONDS,
+        max_tool_calls: int = MAX_TOOL_CALLS
+    ) -> bytes:
         """
+        通用查询接口, 直接返回 JSON 编码后的结果
+
+        工具输出不做逐个的 JSON 化转换, 最终结果只编码一次,
+        HTTP 层可直接作为响应体返回, 不再重复序列化。
+        配置了语义缓存时, 与已回答过的问题语义几乎相同(且年份、公司、指标等关键词一致)的问题
+        直接返回缓存的结果。
+
+        Args:
+            question: 用户问题
+            timeout_s: 查询超时时间(秒)
+            max_tool_calls: 最多允许的工具调用次数
+
+        Returns:
+            与 query 结果结构相同的 JSON 字节串
+
+        Raises:
+            RuntimeError: 查询失败
+        """
+        embedding = await self._embed_question(question)
+        guard = extract_guard_tokens(question)
+        if embedding is not None:
+            content = self.query_cache.get(embedding, guard)
+            if content is not MISSING:
+                logger.info(f"[Agent Query] Semantic cache hit: {question[:100]}...")
+                return content
+
+        result = await self._coalesce(
+            ("json", question),
+            partial(self._do_query, question, timeout_s, max_tool_calls, serialize_tool_output=False)
+        )
+        if result["status"] == "error":
+            raise RuntimeError(result["error"])
+        content = self._dumps_result(result)
+
+        # 只缓存完整的回答(超时或工具调用达到上限时的部分回答不缓存)
+        if embedding is not None and result["status"] == "success":
+            self.query_cache.put(embedding, content, guard)
+        return content
+
+    async def _embed_question(self, question: str) -> Optional[List[float]]:
+        """计算语义缓存使用的问题向量, 未配置语义缓存或计算失败时返回 None"""
+        if self.query_cache is None or self.embed_fn is None:
+            return None
         try:
-            logger.info(f"[Agent Query] Starting query: {question[:100]}...")
+            return await self.embed_fn(question)
+        except Exception as e:
+            logger.warning(f"[Agent Query] Failed to embed question, skipping semantic cache: {str(e)}")
+            return None
 
-            # 导入必要的事件类型
-            from llama_index.core.agent.workflow import (
-                ToolCallResult,
-                ToolCall,
-                AgentStream
-            )
-            logger.info("[Agent Query] Successfully imported event types")
+    async def _coalesce(self, key, run) -> Dict[str, Any]:
+        """
+        合并相同 key 的并发查询: 已有进行中的任务时等待同一任务, 否则调用 run() 创建
 
-            # 运行 Agent 并捕获事件
-            handler = self.agent.run(question)
-            logger.info("[Agent Query] Got handler, starting event stream")
+        Args:
+            key: 查询合并的键
+            run: 返回查询协程的无参函数
+        """
+        task = self._inflight_queries.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run())
+            self._inflight_queries[key] = task
+            task.add_done_callback(partial(self._forget_query, key))
+        else:
+            logger.info(f"[Agent Query] Joining in-flight query: {str(key)[:100]}...")
+        
+        # shield: 某个调用方被取消时不影响共享同一任务的其他调用方
+        return await asyncio.shield(task)
 
-            # 收集工具调用结果
-            visualization_data = None
-            tool_results = []
+    def _forget_query(self, key, task: asyncio.Task) -> None:
+        """查询任务结束后从 _inflight_queries 中移除"""
+        if self._inflight_queries.get(key) is task:
+            del self._inflight_queries[key]
 
-            # 流式处理事件以捕获工具调用结果
+    def _dumps_result(self, result: Dict[str, Any]) -> bytes:
+        """将查询结果编码为 JSON 字节串, orjson 不可用或失败时退回递归序列化"""
+        if orjson is not None:
             try:
-                async for event in handler.stream_events():
-                    logger.info(f"[Agent Query] Got event: {type(event).__name__}")
+                return orjson.dumps(
+                    result,
+                    default=_orjson_default,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                )
+            except TypeError as e:
+                logger.debug(f"orjson serialization failed, falling back: {str(e)}")
+        return json.dumps(
+            self._serialize_tool_output(result), ensure_ascii=False, default=str
+        ).encode('utf-8')
 
-                    if isinstance(event, ToolCall):
-                        logger.info(f"[Agent Query] Tool call: {event.tool_name} with {event.tool_kwargs}")
+    @staticmethod
+    def _visualization_payload(tool_output, embed_json: bool = False) -> Any:
+        """
+        取出可视化工具的输出(generate_visualization_for_query 返回的 JSON 字符串)
 
-                    elif isinstance(event, ToolCallResult):
-                        logger.info(f"[Agent Query] Tool call result: {event.tool_name}")
+        Args:
+            tool_output: ToolOutput 对象, 或 _serialize_tool_output 转换后的 dict
+            embed_json: 为 True 且 orjson 支持 Fragment 时原样嵌入最终结果(供 query_json 使用),
+                否则解析为 dict
 
-                        # 将ToolOutput转换为可序列化的格式
-                        tool_output_serializable = self._serialize_tool_output(event.tool_output)
+        Returns:
+            可视化响应
+        """
+        if isinstance(tool_output, dict):
+            raw = tool_output.get("raw_output", tool_output)
+        else:
+            raw = getattr(tool_output, "raw_output", tool_output)
+        if not isinstance(raw, (str, bytes)):
+            return raw
+        if embed_json and _JSON_FRAGMENT is not None:
+            return _JSON_FRAGMENT(raw)
+        return json.loads(raw)
 
-                        tool_results.append({
-                            "tool_name": event.tool_name,
-                            "tool_kwargs": event.tool_kwargs,
-                            "tool_output": tool_output_serializable
-                        })
+    async def _do_query(
+        self,
+        question: str,
+        timeout_s: float = QUERY_TIMEOUT_SECONDS,
+        max_tool_calls: int = MAX_TOOL_CALLS,
+        serialize_tool_output: bool = True
+    ) -> Dict[str, Any]:
+        """
+        执行查询(query 的实际实现), 汇总 query_stream 输出的事件
 
-                        # 如果是可视化工具，保存其输出
-                        if event.tool_name == "generate_visualization":
-                            logger.info("[Agent Query] Found visualization tool call")
-                            visualization_data = tool_output_serializable
+        Args:
+            question: 用户问题
+            timeout_s: 查询超时时间(秒)
+            max_tool_calls: 最多允许的工具调用次数
+            serialize_tool_output: 是否将工具输出转换为可JSON序列化的格式
 
-                    elif isinstance(event, AgentStream):
-                        # 流式输出（可选）
-                        pass
+        Returns:
+            查询结果（包含可视化数据）
+        """
+        try:
+            visualization_data = None
+            tool_results = []
+            final_event = {}
 
-            except Exception as stream_error:
-                logger.error(f"[Agent Query] Error during event streaming: {str(stream_error)}")
-                import traceback
-                logger.error(traceback.format_exc())
+            async for event in self.query_stream(question, timeout_s, max_tool_calls, serialize_tool_output):
+                if event["type"] == "tool_result":
+                    tool_results.append({
+                        "tool_name": event["tool_name"],
+                        "tool_kwargs": event["tool_kwargs"],
+                        "tool_output": event["tool_output"]
+                    })
 
-            # 获取最终响应
-            logger.info("[Agent Query] Waiting for final response")
-            response = await handler
-            logger.info(f"[Agent Query] Got final response type: {type(response)}")
+                    # 如果是可视化工具，保存其输出
+                    if event["tool_name"] == "generate_visualization":
+                        logger.info("[Agent Query] Found visualization tool call")
+                        visualization_data = self._visualization_payload(
+                            event["tool_output"], embed_json=not serialize_tool_output
+                        )
+                else:
+                    final_event = event
 
             result = {
-                "status": "success",
+                "status": final_event.get("status", "success"),
                 "question": question,
-                "answer": str(response),
-                "structured_response": response.structured_response if hasattr(response, 'structured_response') else None,
+                "answer": final_event.get("answer"),
+                "structured_response": final_event.get("structured_response"),
                 "tool_calls": tool_results
             }
+            if "reason" in final_event:
+                result["reason"] = final_event["reason"]
 
             # 如果有可视化数据，添加到响应中
             if visualization_data:
@@ -449,3 +982,126 @@ class ReportAgent:
                 "question": question
             }
 
+    async def query_stream(
+        self,
+        question: str,
+        timeout_s: float = QUERY_TIMEOUT_SECONDS,
+        max_tool_calls: int = MAX_TOOL_CALLS,
+        serialize_tool_output: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式查询接口: 每个工具调用结果产生后立即输出, 不等待整个 Agent 运行结束
+
+        超过 timeout_s 或工具调用达到 max_tool_calls 次时取消 Agent 运行,
+        已产生的工具结果保留, 最后一个事件的 status 为 partial。
+
+        Args:
+            question: 用户问题
+            timeout_s: 查询超时时间(秒)
+            max_tool_calls: 最多允许的工具调用次数
+            serialize_tool_output: 是否将工具输出转换为可JSON序列化的格式(False 时输出原始对象)
+
+        Yields:
+            {"type": "tool_result", "tool_name", "tool_kwargs", "tool_output"} 每个工具调用结果;
+            最后一个事件为 {"type": "answer", "status", "answer", "structured_response"},
+            status 为 partial 时另含 reason
+        """
+        logger.info(f"[Agent Query] Starting query: {question[:100]}...")
+
+        # 导入必要的事件类型
+        from llama_index.core.agent.workflow import (
+            ToolCallResult,
+            ToolCall,
+            AgentStream
+        )
+        logger.info("[Agent Query] Successfully imported event types")
+
+        # 运行 Agent 并捕获事件
+        handler = self.agent.run(question)
+        logger.info("[Agent Query] Got handler, starting event stream")
+
+        # 流式处理事件, 工具调用结果随到随发; 整个查询共用一个截止时间
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_s
+        events = handler.stream_events().__aiter__()
+        tool_calls = 0
+        stop_reason = None
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                # 事件循环中使用惰性格式化, 日志级别不够时不拼接字符串
+                logger.debug("[Agent Query] Got event: %s", type(event).__name__)
+
+                if isinstance(event, ToolCall):
+                    logger.debug("[Agent Query] Tool call: %s with %s", event.tool_name, event.tool_kwargs)
+
+                elif isinstance(event, ToolCallResult):
+                    logger.info("[Agent Query] Tool call result: %s", event.tool_name)
+
+                    # 将ToolOutput转换为可序列化的格式
+                    tool_output = event.tool_output
+                    if serialize_tool_output:
+                        tool_output = self._serialize_tool_output(tool_output)
+                    yield {
+                        "type": "tool_result",
+                        "tool_name": event.tool_name,
+                        "tool_kwargs": event.tool_kwargs,
+                        "tool_output": tool_output
+                    }
+
+                    tool_calls += 1
+                    if tool_calls >= max_tool_calls:
+                        stop_reason = f"工具调用次数达到上限({max_tool_calls})"
+                        break
+
+                elif isinstance(event, AgentStream):
+                    # 流式输出（可选）
+                    pass
+
+        except asyncio.TimeoutError:
+            stop_reason = f"查询超时({timeout_s}秒)"
+        except Exception as stream_error:
+            logger.error(f"[Agent Query] Error during event streaming: {str(stream_error)}")
+            import traceback
+            logger.error(traceback.format_exc())
+
+        # 获取最终响应(事件流结束后通常已完成, 仍受同一截止时间约束)
+        if stop_reason is None:
+            logger.info("[Agent Query] Waiting for final response")
+            try:
+                response = await asyncio.wait_for(handler, max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                stop_reason = f"查询超时({timeout_s}秒)"
+
+        if stop_reason is not None:
+            logger.warning(f"[Agent Query] Stopping agent run: {stop_reason}")
+            await self._cancel_run(handler)
+            yield {
+                "type": "answer",
+                "status": "partial",
+                "answer": None,
+                "structured_response": None,
+                "reason": stop_reason
+            }
+            return
+
+        logger.info(f"[Agent Query] Got final response type: {type(response)}")
+
+        yield {
+            "type": "answer",
+            "status": "success",
+            "answer": str(response),
+            "structured_response": response.structured_response if hasattr(response, 'structured_response') else None
+        }
+
+    @staticmethod
+    async def _cancel_run(handler) -> None:
+        """取消 Agent 运行(停止后续的 LLM 和工具调用)"""
+        try:
+            await handler.cancel_run()
+        except Exception as e:
+            logger.debug(f"[Agent Query] cancel_run failed, cancelling handler: {str(e)}")
+            handler.cancel()
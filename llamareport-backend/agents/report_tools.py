@@ -3,9 +3,11 @@
 每个工具负责生成报告的一个章节
 """
 
+import asyncio
+import functools
 import logging
-from typing import Dict, Any, List, Optional, Annotated
-from llama_index.core.tools import FunctionTool, QueryEngineTool
+import weakref
+from typing import TYPE_CHECKING, Dict, Any, Annotated, Tuple
 from llama_index.core import Settings
 from llama_index.core.llms import ChatMessage
 from models.report_models import (
@@ -13,24 +15,20 @@ from models.report_models import (
     BusinessGuidance,
     BusinessHighlights,
     ProfitForecastAndValuation,
-    PerformanceSummary,
-    FinancialMetrics,
-    FinancialIndicator,
-    FinancialCharts,
-    PerformanceComparison,
-    MetricAttribution,
-    BusinessHighlight,
-    ConsensusForecas,
-    ValuationAnalysis
+    AnnualReportAnalysis
 )
-from agents.visualization_agent import generate_visualization_for_query
+from core.llm_limiter import call_llm
+from core.section_cache import MISSING, SectionCache
+
+if TYPE_CHECKING:
+    from llama_index.core.tools import QueryEngineTool
 
 logger = logging.getLogger(__name__)
 
 
 # ==================== 数据检索工具 ====================
 
-def create_query_engine_tool(query_engine, name: str, description: str) -> QueryEngineTool:
+def create_query_engine_tool(query_engine, name: str, description: str) -> "QueryEngineTool":
     """
     创建查询引擎工具
     
@@ -42,6 +40,9 @@ def create_query_engine_tool(query_engine, name: str, description: str) -> Query
     Returns:
         QueryEngineTool 实例
     """
+    # 仅在创建工具时需要, 延迟导入
+    from llama_index.core.tools import QueryEngineTool
+    
     return QueryEngineTool.from_defaults(
         query_engine=query_engine,
         name=name,
@@ -51,6 +52,166 @@ def create_query_engine_tool(query_engine, name: str, description: str) -> Query
 
 # ==================== 财务数据检索工具 ====================
 
+def _build_financial_query(company_name: str, year: str, metric_type: str) -> str:
+    """构建财务数据检索查询"""
+    query_map = {
+        "revenue": f"{company_name} {year}年 营业收入 收入增长率 毛利率",
+        "profit": f"{company_name} {year}年 净利润 归母净利润 扣非净利润 利润增长率",
+        "cash_flow": f"{company_name} {year}年 经营活动现金流 投资活动现金流 筹资活动现金流",
+        "balance_sheet": f"{company_name} {year}年 总资产 总负债 资产负债率 净资产"
+    }
+    return query_map.get(metric_type, f"{company_name} {year}年 {metric_type}")
+
+
+def _build_business_query(company_name: str, year: str, business_type: str) -> str:
+    """构建业务数据检索查询"""
+    return f"{company_name} {year}年 {business_type} 业务收入 业务增长 市场份额"
+
+
+def _build_guidance_query(company_name: str, year: str) -> str:
+    """构建业绩指引检索查询"""
+    return f"{company_name} {year}年 业绩预告 业绩指引 下一年度预期 经营计划"
+
+
+def _build_highlights_query(company_name: str, year: str) -> str:
+    """构建业务亮点检索查询"""
+    return f"{company_name} {year}年 业务亮点 主要成就 重大项目 技术创新 市场拓展"
+
+
+def _build_forecast_query(company_name: str) -> str:
+    """构建盈利预测和估值检索查询"""
+    return f"{company_name} 盈利预测 机构评级 目标价 估值分析 PE PB ROE"
+
+
+# Settings.llm(_STRUCTURED_LLM_OWNER) 的结构化 LLM: 输出模型 -> StructuredLLM
+_STRUCTURED_LLMS: Dict[type, Any] = {}
+_STRUCTURED_LLM_OWNER = None
+
+
+def _sllm(output_cls: type):
+    """
+    获取 Settings.llm 针对 output_cls 的结构化 LLM, 重复调用时复用同一对象
+    
+    Settings.llm 被替换时清空缓存, 按新的 LLM 重新创建
+    """
+    global _STRUCTURED_LLM_OWNER
+    llm = Settings.llm
+    if llm is not _STRUCTURED_LLM_OWNER:
+        _STRUCTURED_LLMS.clear()
+        _STRUCTURED_LLM_OWNER = llm
+    sllm = _STRUCTURED_LLMS.get(output_cls)
+    if sllm is None:
+        sllm = _STRUCTURED_LLMS[output_cls] = llm.as_structured_llm(output_cls)
+    return sllm
+
+
+# _get_retrieval_cache 创建的全部检索缓存, 索引变化时由 clear_retrieval_caches 统一清空
+_RETRIEVAL_CACHES: "weakref.WeakSet[SectionCache]" = weakref.WeakSet()
+
+
+@functools.lru_cache(maxsize=32)
+def _get_retrieval_cache(query_engine) -> SectionCache:
+    """
+    获取 query_engine 对应的检索结果缓存
+    
+    键为 (检索类型, 公司名称, 年份, 指标/业务类型), 同步和异步检索共用;
+    只缓存成功的检索结果, 章节重新生成或重试时直接复用
+    """
+    cache = SectionCache(capacity=1024, ttl_seconds=3600)
+    _RETRIEVAL_CACHES.add(cache)
+    return cache
+
+
+def clear_retrieval_caches() -> None:
+    """清空全部检索缓存(索引构建或重建后调用, 避免返回旧索引的检索结果)"""
+    for cache in list(_RETRIEVAL_CACHES):
+        cache.clear()
+
+
+async def _aquery(query_engine, query: str):
+    """
+    异步执行查询, 不阻塞事件循环
+    
+    优先使用 LlamaIndex 原生的 aquery, 查询引擎不支持时在线程中执行同步 query
+    """
+    aquery = getattr(query_engine, "aquery", None)
+    if aquery is None:
+        return await asyncio.to_thread(query_engine.query, query)
+    return await aquery(query)
+
+
+# 检索类型 -> (日志中的名称, 查询构建函数)
+_RETRIEVAL_KINDS = {
+    "financial": ("财务数据", _build_financial_query),
+    "business": ("业务数据", _build_business_query),
+}
+
+
+def _retrieval_lookup(query_engine, kind: str, company_name: str, year: str, item: str):
+    """
+    查找检索缓存, _cached_retrieval 与 _acached_retrieval 共用
+    
+    Returns:
+        (缓存, 缓存键, 缓存结果), 未命中时缓存结果为 MISSING
+    """
+    cache = _get_retrieval_cache(query_engine)
+    key = (kind, company_name, year, item)
+    result = cache.get(key)
+    if result is not MISSING:
+        logger.info(f"✅ 检索缓存命中: {_RETRIEVAL_KINDS[kind][0]} {item}")
+    return cache, key, result
+
+
+def _store_retrieval(cache: SectionCache, key: Tuple, result) -> str:
+    """写入检索缓存并返回结果文本"""
+    kind, _, _, item = key
+    result = str(result)
+    cache.set(key, result)
+    logger.info(f"✅ 检索{_RETRIEVAL_KINDS[kind][0]}成功: {item}")
+    return result
+
+
+def _retrieval_failed(kind: str, e: Exception) -> str:
+    logger.error(f"❌ 检索{_RETRIEVAL_KINDS[kind][0]}失败: {str(e)}")
+    return f"检索失败: {str(e)}"
+
+
+def _cached_retrieval(query_engine, kind: str, company_name: str, year: str, item: str) -> str:
+    """
+    带缓存的同步检索, 只缓存成功的结果
+    
+    Args:
+        query_engine: 查询引擎(每个查询引擎一份缓存)
+        kind: 检索类型, 见 _RETRIEVAL_KINDS
+        company_name: 公司名称
+        year: 年份
+        item: 指标类型或业务类型
+    
+    Returns:
+        检索结果的文本描述, 失败时为错误信息
+    """
+    try:
+        cache, key, result = _retrieval_lookup(query_engine, kind, company_name, year, item)
+        if result is not MISSING:
+            return result
+        query = _RETRIEVAL_KINDS[kind][1](company_name, year, item)
+        return _store_retrieval(cache, key, query_engine.query(query))
+    except Exception as e:
+        return _retrieval_failed(kind, e)
+
+
+async def _acached_retrieval(query_engine, kind: str, company_name: str, year: str, item: str) -> str:
+    """带缓存的异步检索(参数和返回值同 _cached_retrieval)"""
+    try:
+        cache, key, result = _retrieval_lookup(query_engine, kind, company_name, year, item)
+        if result is not MISSING:
+            return result
+        query = _RETRIEVAL_KINDS[kind][1](company_name, year, item)
+        return _store_retrieval(cache, key, await _aquery(query_engine, query))
+    except Exception as e:
+        return _retrieval_failed(kind, e)
+
+
 def retrieve_financial_data(
     company_name: Annotated[str, "公司名称"],
     year: Annotated[str, "年份,如'2023'"],
@@ -71,26 +232,28 @@ def retrieve_financial_data(
     Returns:
         财务数据的文本描述
     """
-    try:
-        # 构建查询
-        query_map = {
-            "revenue": f"{company_name} {year}年 营业收入 收入增长率 毛利率",
-            "profit": f"{company_name} {year}年 净利润 归母净利润 扣非净利润 利润增长率",
-            "cash_flow": f"{company_name} {year}年 经营活动现金流 投资活动现金流 筹资活动现金流",
-            "balance_sheet": f"{company_name} {year}年 总资产 总负债 资产负债率 净资产"
-        }
-        
-        query = query_map.get(metric_type, f"{company_name} {year}年 {metric_type}")
-        
-        # 执行查询
-        response = query_engine.query(query)
-        
-        logger.info(f"✅ 检索财务数据成功: {metric_type}")
-        return str(response)
-        
-    except Exception as e:
-        logger.error(f"❌ 检索财务数据失败: {str(e)}")
-        return f"检索失败: {str(e)}"
+    return _cached_retrieval(query_engine, "financial", company_name, year, metric_type)
+
+
+async def retrieve_financial_data_async(
+    company_name: str,
+    year: str,
+    metric_type: str,
+    query_engine: Any
+) -> str:
+    """
+    检索财务数据(异步版本, 供章节生成函数并发检索)
+    
+    Args:
+        company_name: 公司名称
+        year: 年份
+        metric_type: 指标类型
+        query_engine: 查询引擎
+    
+    Returns:
+        财务数据的文本描述
+    """
+    return await _acached_retrieval(query_engine, "financial", company_name, year, metric_type)
 
 
 def retrieve_business_data(
@@ -113,16 +276,28 @@ def retrieve_business_data(
     Returns:
         业务数据的文本描述
     """
-    try:
-        query = f"{company_name} {year}年 {business_type} 业务收入 业务增长 市场份额"
-        response = query_engine.query(query)
-        
-        logger.info(f"✅ 检索业务数据成功: {business_type}")
-        return str(response)
-        
-    except Exception as e:
-        logger.error(f"❌ 检索业务数据失败: {str(e)}")
-        return f"检索失败: {str(e)}"
+    return _cached_retrieval(query_engine, "business", company_name, year, business_type)
+
+
+async def retrieve_business_data_async(
+    company_name: str,
+    year: str,
+    business_type: str,
+    query_engine: Any
+) -> str:
+    """
+    检索业务数据(异步版本, 供章节生成函数并发检索)
+    
+    Args:
+        company_name: 公司名称
+        year: 年份
+        business_type: 业务类型
+        query_engine: 查询引擎
+    
+    Returns:
+        业务数据的文本描述
+    """
+    return await _acached_retrieval(query_engine, "business", company_name, year, business_type)
 
 
 # ==================== 章节生成工具 ====================
@@ -152,14 +327,14 @@ async def generate_financial_review(
     try:
         logger.info(f"开始生成财务点评: {company_name} {year}年")
         
-        # 1. 检索财务数据
-        revenue_data = retrieve_financial_data(company_name, year, "revenue", query_engine)
-        profit_data = retrieve_financial_data(company_name, year, "profit", query_engine)
-        cash_flow_data = retrieve_financial_data(company_name, year, "cash_flow", query_engine)
+        # 1. 并发检索财务数据
+        revenue_data, profit_data, cash_flow_data = await asyncio.gather(
+            retrieve_financial_data_async(company_name, year, "revenue", query_engine),
+            retrieve_financial_data_async(company_name, year, "profit", query_engine),
+            retrieve_financial_data_async(company_name, year, "cash_flow", query_engine)
+        )
         
         # 2. 使用 LLM 生成结构化的财务点评
-        llm = Settings.llm
-
         prompt = f"""
 基于以下财务数据,生成{company_name} {year}年的财务点评。
 
@@ -182,8 +357,8 @@ async def generate_financial_review(
 """
 
         # 使用结构化输出
-        sllm = llm.as_structured_llm(FinancialReview)
-        response = await sllm.achat([
+        sllm = _sllm(FinancialReview)
+        response = await call_llm(sllm.achat, [
             ChatMessage(role="system", content="你是一个专业的财务分析师,擅长分析年报数据。"),
             ChatMessage(role="user", content=prompt)
         ])
@@ -223,12 +398,10 @@ async def generate_business_guidance(
         logger.info(f"开始生成业绩指引: {company_name} {year}年")
         
         # 检索业绩指引相关数据
-        query = f"{company_name} {year}年 业绩预告 业绩指引 下一年度预期 经营计划"
-        guidance_data = query_engine.query(query)
+        query = _build_guidance_query(company_name, year)
+        guidance_data = await _aquery(query_engine, query)
         
         # 使用 LLM 生成结构化的业绩指引
-        llm = Settings.llm
-
         prompt = f"""
 基于以下数据,生成{company_name} {year}年的业绩指引。
 
@@ -245,8 +418,8 @@ async def generate_business_guidance(
 请以JSON格式输出,符合 BusinessGuidance 模型的结构。
 """
 
-        sllm = llm.as_structured_llm(BusinessGuidance)
-        response = await sllm.achat([
+        sllm = _sllm(BusinessGuidance)
+        response = await call_llm(sllm.achat, [
             ChatMessage(role="system", content="你是一个专业的财务分析师,擅长分析业绩指引。"),
             ChatMessage(role="user", content=prompt)
         ])
@@ -282,12 +455,10 @@ async def generate_business_highlights(
         logger.info(f"开始生成业务亮点: {company_name} {year}年")
         
         # 检索业务亮点数据
-        query = f"{company_name} {year}年 业务亮点 主要成就 重大项目 技术创新 市场拓展"
-        highlights_data = query_engine.query(query)
+        query = _build_highlights_query(company_name, year)
+        highlights_data = await _aquery(query_engine, query)
         
         # 使用 LLM 生成结构化的业务亮点
-        llm = Settings.llm
-
         prompt = f"""
 基于以下数据,生成{company_name} {year}年的业务亮点。
 
@@ -302,8 +473,8 @@ async def generate_business_highlights(
 请以JSON格式输出,符合 BusinessHighlights 模型的结构。
 """
 
-        sllm = llm.as_structured_llm(BusinessHighlights)
-        response = await sllm.achat([
+        sllm = _sllm(BusinessHighlights)
+        response = await call_llm(sllm.achat, [
             ChatMessage(role="system", content="你是一个专业的业务分析师,擅长总结业务亮点。"),
             ChatMessage(role="user", content=prompt)
         ])
@@ -342,12 +513,10 @@ async def generate_profit_forecast_and_valuation(
         logger.info(f"开始生成盈利预测和估值: {company_name} {year}年")
         
         # 检索预测和估值数据
-        query = f"{company_name} 盈利预测 机构评级 目标价 估值分析 PE PB ROE"
-        forecast_data = query_engine.query(query)
+        query = _build_forecast_query(company_name)
+        forecast_data = await _aquery(query_engine, query)
         
         # 使用 LLM 生成结构化的盈利预测和估值
-        llm = Settings.llm
-
         prompt = f"""
 基于以下数据,生成{company_name}的盈利预测和估值分析。
 
@@ -363,8 +532,8 @@ async def generate_profit_forecast_and_valuation(
 请以JSON格式输出,符合 ProfitForecastAndValuation 模型的结构。
 """
 
-        sllm = llm.as_structured_llm(ProfitForecastAndValuation)
-        response = await sllm.achat([
+        sllm = _sllm(ProfitForecastAndValuation)
+        response = await call_llm(sllm.achat, [
             ChatMessage(role="system", content="你是一个专业的投资分析师,擅长盈利预测和估值分析。"),
             ChatMessage(role="user", content=prompt)
         ])
@@ -377,3 +546,152 @@ async def generate_profit_forecast_and_valuation(
         logger.error(f"❌ 生成盈利预测和估值失败: {str(e)}")
         raise
 
+
+# ==================== 完整报告(单次调用) ====================
+
+async def generate_annual_report_analysis(
+    company_name: Annotated[str, "公司名称"],
+    year: Annotated[str, "年份,如'2023'"],
+    query_engine: Any
+) -> Dict[str, Any]:
+    """
+    一次 LLM 调用生成完整的年报分析报告
+    
+    四个章节所需的检索并发执行, 合并为一份上下文后以 AnnualReportAnalysis
+    结构化输出一次生成全部章节和总结, 公共上下文只需处理一次。
+    结构化输出校验失败时抛出异常, 由调用方退回逐章节生成。
+    
+    Args:
+        company_name: 公司名称
+        year: 年份
+        query_engine: 查询引擎
+    
+    Returns:
+        与 AnnualReportAnalysis 结构一致的完整报告
+    """
+    logger.info(f"开始单次生成年报分析: {company_name} {year}年")
+    
+    # 1. 并发检索全部章节所需的数据
+    revenue_data, profit_data, cash_flow_data, guidance_data, highlights_data, forecast_data = (
+        await asyncio.gather(
+            retrieve_financial_data_async(company_name, year, "revenue", query_engine),
+            retrieve_financial_data_async(company_name, year, "profit", query_engine),
+            retrieve_financial_data_async(company_name, year, "cash_flow", query_engine),
+            _aquery(query_engine, _build_guidance_query(company_name, year)),
+            _aquery(query_engine, _build_highlights_query(company_name, year)),
+            _aquery(query_engine, _build_forecast_query(company_name))
+        )
+    )
+    
+    # 2. 一次结构化输出生成全部章节
+    prompt = f"""
+基于以下数据,生成{company_name} {year}年的完整年报分析报告。
+
+收入数据:
+{revenue_data}
+
+利润数据:
+{profit_data}
+
+现金流数据:
+{cash_flow_data}
+
+业绩指引数据:
+{str(guidance_data)}
+
+业务亮点数据:
+{str(highlights_data)}
+
+预测和估值数据:
+{str(forecast_data)}
+
+请生成结构化的年报分析报告,包括:
+一、财务点评(财务图表描述、业绩速览、业绩和预期的比较、财务指标变动归因)
+二、业绩指引(业绩预告期间、预计的经营业绩、归母净利润范围、各业务具体指引、风险提示)
+三、业务亮点(各业务类型的亮点描述、主要成就、业务亮点总结)
+四、盈利预测和估值(一致预测、一致预期变化、具体机构预测、估值分析)
+五、总结(综合以上各部分的要点)
+
+请以JSON格式输出,符合 AnnualReportAnalysis 模型的结构。
+"""
+
+    sllm = _sllm(AnnualReportAnalysis)
+    response = await call_llm(sllm.achat, [
+        ChatMessage(role="system", content="你是一个专业的财务分析师,擅长分析年报数据并撰写完整的年报分析报告。"),
+        ChatMessage(role="user", content=prompt)
+    ])
+
+    report = response.raw.model_dump()
+    report["company_name"] = company_name
+    report["report_year"] = year
+    
+    logger.info(f"✅ 年报分析单次生成成功")
+    return report
+
+
+# ==================== 综合分析工具 ====================
+
+# 综合分析所需的检索: (标签, 检索函数, 检索参数), 彼此独立, 可并发执行
+COMPREHENSIVE_RETRIEVALS = (
+    ("收入数据", retrieve_financial_data_async, "revenue"),
+    ("利润数据", retrieve_financial_data_async, "profit"),
+    ("现金流数据", retrieve_financial_data_async, "cash_flow"),
+    ("资产负债数据", retrieve_financial_data_async, "balance_sheet"),
+    ("主营业务数据", retrieve_business_data_async, "主营业务"),
+)
+
+
+async def generate_comprehensive_analysis(
+    company_name: Annotated[str, "公司名称"],
+    year: Annotated[str, "年份,如'2023'"],
+    query_engine: Any
+) -> str:
+    """
+    生成综合分析
+    
+    收入、利润、现金流、资产负债和主营业务五项检索互不依赖,
+    并发执行后只调用一次 LLM 进行综合分析。
+    
+    Args:
+        company_name: 公司名称
+        year: 年份
+        query_engine: 查询引擎
+    
+    Returns:
+        综合分析文本
+    """
+    try:
+        logger.info(f"开始生成综合分析: {company_name} {year}年")
+        
+        # 1. 并发检索
+        results = await asyncio.gather(*(
+            retrieve_fn(company_name, year, arg, query_engine)
+            for _, retrieve_fn, arg in COMPREHENSIVE_RETRIEVALS
+        ))
+        
+        context = "\n\n".join(
+            f"{label}:\n{data}"
+            for (label, _, _), data in zip(COMPREHENSIVE_RETRIEVALS, results)
+        )
+        
+        # 2. 一次 LLM 调用完成综合分析
+        prompt = f"""
+基于以下数据,对{company_name} {year}年的经营和财务状况进行综合分析。
+
+{context}
+
+请从盈利能力、成长性、现金流质量、偿债能力和主营业务表现等方面进行分析,
+指出主要亮点和风险,并给出总体评价。
+"""
+        
+        response = await call_llm(Settings.llm.achat, [
+            ChatMessage(role="system", content="你是一个专业的财务分析师,擅长综合分析年报数据。"),
+            ChatMessage(role="user", content=prompt)
+        ])
+        
+        logger.info(f"✅ 综合分析生成成功")
+        return response.message.content
+        
+    except Exception as e:
+        logger.error(f"❌ 生成综合分析失败: {str(e)}")
+        raise
@@ -3,24 +3,74 @@ Jinja2 模板渲染器
 将结构化数据渲染为 Markdown 报告
 """
 
+import functools
 import logging
 from pathlib import Path
-from typing import Dict, Any
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from models.report_models import AnnualReportAnalysis
+from typing import TYPE_CHECKING, Dict, Any
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+    from models.report_models import AnnualReportAnalysis
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=1)
+def _get_bytecode_cache():
+    """
+    获取模板字节码缓存(默认位于系统临时目录下的用户私有目录)
+    
+    编译后的模板字节码保存在磁盘上, 进程重启后无需重新解析模板;
+    缓存目录不可用时返回 None(仅使用内存缓存)
+    """
+    from jinja2 import FileSystemBytecodeCache
+    
+    try:
+        return FileSystemBytecodeCache()
+    except Exception as e:
+        logger.warning(f"⚠️ 模板字节码缓存不可用: {str(e)}")
+        return None
+
+
+@functools.lru_cache(maxsize=16)
+def _get_env(template_dir: str, auto_reload: bool = False) -> "Environment":
+    """
+    获取模板目录对应的 Jinja2 环境(按目录缓存)
+    
+    同一目录共用一个环境, 模板只解析编译一次, 字节码同时写入磁盘缓存;
+    auto_reload=False 时渲染前不再检查模板文件是否修改。
+    
+    Args:
+        template_dir: 模板目录的绝对路径
+        auto_reload: 模板文件修改后是否自动重新加载(开发时使用)
+    
+    Returns:
+        Jinja2 环境
+    """
+    # jinja2 只在首次创建渲染器时导入
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+    
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        autoescape=select_autoescape(['html', 'xml']),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        auto_reload=auto_reload,
+        cache_size=400,
+        bytecode_cache=_get_bytecode_cache()
+    )
+
+
 class TemplateRenderer:
     """模板渲染器"""
     
-    def __init__(self, template_dir: str = "templates"):
+    def __init__(self, template_dir: str = "templates", auto_reload: bool = False):
         """
         初始化渲染器
         
         Args:
             template_dir: 模板目录路径
+            auto_reload: 模板文件修改后是否自动重新加载(开发时使用)
         """
         self.template_dir = Path(template_dir)
         
@@ -28,13 +78,8 @@ class TemplateRenderer:
         if not self.template_dir.exists():
             raise FileNotFoundError(f"模板目录不存在: {self.template_dir}")
         
-        # 创建 Jinja2 环境
-        self.env = Environment(
-            loader=FileSystemLoader(str(self.template_dir)),
-            autoescape=select_autoescape(['html', 'xml']),
-            trim_blocks=True,
-            lstrip_blocks=True
-        )
+        # 获取 Jinja2 环境(同一目录的渲染器共用, 模板只编译一次)
+        self.env = _get_env(str(self.template_dir.resolve()), auto_reload)
         
         logger.info(f"✅ TemplateRenderer 初始化成功,模板目录: {self.template_dir}")
     
@@ -69,7 +114,7 @@ class TemplateRenderer:
     
     def render_from_pydantic(
         self,
-        report: AnnualReportAnalysis,
+        report: "AnnualReportAnalysis",
         template_name: str = "annual_report_template.md.jinja2"
     ) -> str:
         """
@@ -83,8 +128,9 @@ class TemplateRenderer:
             渲染后的 Markdown 文本
         """
         try:
-            # 将 Pydantic 模型转换为字典
-            report_dict = report.dict()
+            # 将 Pydantic 模型转换为字典(Pydantic v2 序列化; 保留值为 None 的可选字段,
+            # 模板中访问其属性时渲染为空, 键缺失则会报错)
+            report_dict = report.model_dump()
             
             # 渲染
             return self.render_report(report_dict, template_name)
@@ -111,15 +157,12 @@ class TemplateRenderer:
             是否成功
         """
         try:
-            # 渲染报告
-            rendered = self.render_report(report_data, template_name)
-            
-            # 保存到文件
             output_file = Path(output_path)
             output_file.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(rendered)
+            # 边渲染边写入文件, 不在内存中拼出完整报告
+            template = self.env.get_template(template_name)
+            template.stream(**report_data).dump(str(output_file), encoding='utf-8')
             
             logger.info(f"✅ 报告已保存到: {output_path}")
             return True
@@ -173,6 +216,12 @@ class TemplateRenderer:
 
 # 便捷函数
 
+@functools.lru_cache(maxsize=16)
+def _get_renderer(template_dir: str) -> TemplateRenderer:
+    """获取模板目录对应的渲染器(便捷函数共用, 不再每次调用都创建)"""
+    return TemplateRenderer(template_dir)
+
+
 def render_annual_report(
     report_data: Dict[str, Any],
     template_dir: str = "templates",
@@ -189,8 +238,7 @@ def render_annual_report(
     Returns:
         渲染后的 Markdown 文本
     """
-    renderer = TemplateRenderer(template_dir)
-    return renderer.render_report(report_data, template_name)
+    return _get_renderer(template_dir).render_report(report_data, template_name)
 
 
 def save_annual_report(
@@ -211,6 +259,5 @@ def save_annual_report(
     Returns:
         是否成功
     """
-    renderer = TemplateRenderer(template_dir)
-    return renderer.save_report(report_data, output_path, template_name)
+    return _get_renderer(template_dir).save_report(report_data, output_path, template_name)
 
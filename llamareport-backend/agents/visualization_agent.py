@@ -3,12 +3,17 @@
 智能分析数据并生成合适的图表配置
 """
 
-import logging
 import json
+import logging
 import re
+from contextlib import aclosing
+from functools import cached_property
+import numpy as np
 from typing import Dict, Any, List, Optional, Annotated
 from llama_index.core import Settings
 from llama_index.core.llms import ChatMessage
+from pydantic import ValidationError
+from core.llm_limiter import stream_llm
 from models.visualization_models import (
     ChartType,
     ChartRecommendation,
@@ -22,11 +27,52 @@ from models.visualization_models import (
     MultiLineChart,
     GroupedBarChart,
     TableChart,
-    VisualizationInsight
+    VisualizationInsight,
+    VisualizationExtraction
 )
 
 logger = logging.getLogger(__name__)
 
+# 查询中出现这些关键词时认为可能需要可视化
+VIZ_KEYWORDS = (
+    '趋势', '对比', '比较', '增长', '下降', '变化',
+    '分布', '占比', '份额', '排名', '图表', '可视化',
+    '多少', '如何', '怎样', '数据', '指标', '财务',
+    '收入', '利润', '资产', '负债', '现金流'
+)
+
+# 所有关键词合并为一个正则, 一次扫描查询即可判断是否命中任一关键词
+_VIZ_KEYWORD_RE = re.compile("|".join(map(re.escape, VIZ_KEYWORDS)))
+
+# 判断回答中是否包含数字(找到第一个数字即停止)
+_NUMBER_RE = re.compile(r'\d')
+
+# 数据类型 -> 推荐图表类型(模型未给出推荐时使用的简单规则)
+_TYPE_MAPPING = {
+    'time_series': ChartType.LINE,
+    'comparison': ChartType.BAR,
+    'distribution': ChartType.PIE,
+    'single_value': ChartType.GAUGE,
+    'table': ChartType.TABLE
+}
+
+# 数据类型 -> 备选图表
+_ALTERNATIVES = {
+    'time_series': [ChartType.AREA, ChartType.MULTI_LINE],
+    'comparison': [ChartType.GROUPED_BAR, ChartType.LINE],
+    'distribution': [ChartType.BAR, ChartType.FUNNEL],
+    'table': [ChartType.HEATMAP]
+}
+
+# 图表类型 -> 图表标题后缀
+_TYPE_SUFFIX = {
+    ChartType.BAR: "对比图",
+    ChartType.LINE: "趋势图",
+    ChartType.PIE: "分布图",
+    ChartType.AREA: "面积图",
+    ChartType.SCATTER: "散点图"
+}
+
 
 class VisualizationAgent:
     """可视化生成Agent"""
@@ -40,6 +86,11 @@ class VisualizationAgent:
         """
         self.llm = llm or Settings.llm
     
+    @cached_property
+    def _extraction_llm(self):
+        """数据提取使用的结构化 LLM(创建一次, 之后的提取复用)"""
+        return self.llm.as_structured_llm(VisualizationExtraction)
+    
     async def generate_visualization(
         self,
         query: str,
@@ -138,20 +189,11 @@ class VisualizationAgent:
             bool: 是否需要可视化
         """
         try:
-            # 关键词检测
-            viz_keywords = [
-                '趋势', '对比', '比较', '增长', '下降', '变化',
-                '分布', '占比', '份额', '排名', '图表', '可视化',
-                '多少', '如何', '怎样', '数据', '指标', '财务',
-                '收入', '利润', '资产', '负债', '现金流'
-            ]
-            
             # 检查查询中是否包含可视化关键词
-            query_lower = query.lower()
-            has_viz_keyword = any(keyword in query for keyword in viz_keywords)
+            has_viz_keyword = _VIZ_KEYWORD_RE.search(query) is not None
             
             # 检查回答中是否包含数字
-            has_numbers = bool(re.search(r'\d+\.?\d*', answer))
+            has_numbers = _NUMBER_RE.search(answer) is not None
             
             # 检查回答长度（如果回答很短，可能不需要可视化）
             answer_length = len(answer)
@@ -176,63 +218,69 @@ class VisualizationAgent:
         """
         从回答中提取数据
         
+        一次结构化输出同时得到数据、推荐图表类型和图表标题,
+        由模型按 VisualizationExtraction 结构约束输出, 无需再从文本中截取JSON。
+        以流式方式接收输出, 模型一开始就判定没有可视化数据(has_data 为 false)时
+        立即结束, 不再等待其余字段生成。
+        
         Args:
             query: 用户查询
             answer: 文本回答
             sources: 数据来源
         
         Returns:
-            Dict: 提取的数据
+            Dict: 提取的数据(VisualizationExtraction 的字段)
         """
         try:
             prompt = f"""
-分析以下查询和回答，提取可用于可视化的数据。
+分析以下查询和回答，提取可用于可视化的数据，并给出图表建议。
 
 查询: {query}
 
 回答: {answer}
 
-请提取以下信息（以JSON格式返回）：
-1. has_data: 是否包含可视化数据（true/false）
+请提取以下信息：
+1. has_data: 是否包含可视化数据
 2. data_type: 数据类型（time_series/comparison/distribution/single_value/table）
-3. labels: 标签列表（如果适用）
-4. values: 数值列表（如果适用）
+3. labels: 标签列表（如 ["2021年", "2022年", "2023年"]）
+4. values: 与标签一一对应的数值列表（如 [100, 120, 150]）
 5. series: 多系列数据（如果适用）
 6. unit: 数值单位（如元、%、万等）
 7. time_period: 时间周期（如果是时间序列）
+8. recommended_chart_type: 最适合的图表类型（趋势用line，对比用bar，占比用pie）
+9. chart_title: 简洁的图表标题
 
-示例输出：
-{{
-    "has_data": true,
-    "data_type": "comparison",
-    "labels": ["2021年", "2022年", "2023年"],
-    "values": [100, 120, 150],
-    "unit": "亿元",
-    "time_period": "年度"
-}}
-
-如果无法提取数据，返回：
-{{
-    "has_data": false
-}}
+如果无法提取数据，has_data 为 false，其余字段留空。
 """
             
-            response = await self.llm.acomplete(prompt)
-            response_text = str(response).strip()
+            sllm = self._extraction_llm
+            messages = [
+                ChatMessage(role="system", content="你是一个数据可视化专家,擅长从文本中提取数据并选择合适的图表。"),
+                ChatMessage(role="user", content=prompt)
+            ]
+            
+            # 每个流式片段的 raw 是截至目前已解析出的(部分)结构化结果, 最后一个即完整结果
+            extraction = None
+            async with aclosing(stream_llm(sllm.astream_chat, messages)) as stream:
+                async for partial in stream:
+                    extraction = partial.raw
+                    if getattr(extraction, 'has_data', None) is False:
+                        break
+            
+            if extraction is None or getattr(extraction, 'has_data', None) is False:
+                return {"has_data": False}
             
-            # 尝试解析JSON
+            # 最终结果未通过校验时, llama-index 返回字段均为 Optional[Any] 的 FlexibleModel,
+            # 其中可能是 None 或字符串, 需重新校验后才能交给图表生成(未生成的字段取默认值)
             try:
-                # 提取JSON部分
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    data = json.loads(json_match.group())
-                    logger.info(f"成功提取数据: {data.get('data_type', 'unknown')}")
-                    return data
-                else:
-                    return {"has_data": False}
-            except json.JSONDecodeError:
-                logger.warning("无法解析LLM返回的JSON")
+                extraction = VisualizationExtraction.model_validate(extraction.model_dump(exclude_none=True))
+            except ValidationError as e:
+                logger.warning(f"提取结果未通过校验, 按无可视化数据处理: {str(e)}")
                 return {"has_data": False}
+            
+            data = extraction.model_dump()
+            logger.info(f"成功提取数据: {data.get('data_type') or 'unknown'}")
+            return data
                 
         except Exception as e:
             logger.error(f"提取数据失败: {str(e)}")
@@ -254,32 +302,16 @@ class VisualizationAgent:
             ChartRecommendation: 图表推荐
         """
         try:
-            data_type = data.get('data_type', 'unknown')
+            data_type = data.get('data_type') or 'unknown'
             
-            # 基于数据类型的简单规则
-            type_mapping = {
-                'time_series': ChartType.LINE,
-                'comparison': ChartType.BAR,
-                'distribution': ChartType.PIE,
-                'single_value': ChartType.GAUGE,
-                'table': ChartType.TABLE
-            }
-            
-            recommended_type = type_mapping.get(data_type, ChartType.BAR)
-            
-            # 备选图表
-            alternatives = {
-                'time_series': [ChartType.AREA, ChartType.MULTI_LINE],
-                'comparison': [ChartType.GROUPED_BAR, ChartType.LINE],
-                'distribution': [ChartType.BAR, ChartType.FUNNEL],
-                'table': [ChartType.HEATMAP]
-            }
+            # 优先使用提取时模型给出的推荐, 没有时按数据类型规则推荐
+            recommended_type = data.get('recommended_chart_type') or _TYPE_MAPPING.get(data_type, ChartType.BAR)
             
             return ChartRecommendation(
                 recommended_chart_type=recommended_type,
                 reason=f"基于数据类型'{data_type}'，{recommended_type.value}图最适合展示这类数据",
                 data_characteristics=f"数据类型: {data_type}, 数据点数: {len(data.get('values', []))}",
-                alternative_charts=alternatives.get(data_type, [])
+                alternative_charts=_ALTERNATIVES.get(data_type, [])
             )
             
         except Exception as e:
@@ -312,8 +344,11 @@ class VisualizationAgent:
             values = data.get('values', [])
             unit = data.get('unit', '')
 
-            # 生成标题
-            title = self._generate_chart_title(query, chart_type)
+            # 生成标题(优先使用提取时模型给出的标题)
+            title = data.get('chart_title') or self._generate_chart_title(query, chart_type)
+
+            # 数值标签(柱状图和折线图共用, 只构建一次)
+            text_labels = [f"{v}{unit}" for v in values]
 
             # 根据图表类型生成配置
             if chart_type == ChartType.BAR:
@@ -323,7 +358,7 @@ class VisualizationAgent:
                     y=values,
                     type="bar",
                     marker={"color": "rgb(55, 83, 109)"},
-                    text=[f"{v}{unit}" for v in values],
+                    text=text_labels,
                     textposition="auto"
                 )
 
@@ -336,7 +371,7 @@ class VisualizationAgent:
                     mode="lines+markers",
                     line={"color": "rgb(55, 128, 191)", "width": 3},
                     marker={"size": 8},
-                    text=[f"{v}{unit}" for v in values],
+                    text=text_labels,
                     hovertemplate="%{x}: %{y}" + unit + "<extra></extra>"
                 )
 
@@ -400,15 +435,7 @@ class VisualizationAgent:
         title = query[:50] + "..." if len(query) > 50 else query
 
         # 添加图表类型后缀
-        type_suffix = {
-            ChartType.BAR: "对比图",
-            ChartType.LINE: "趋势图",
-            ChartType.PIE: "分布图",
-            ChartType.AREA: "面积图",
-            ChartType.SCATTER: "散点图"
-        }
-
-        suffix = type_suffix.get(chart_type, "")
+        suffix = _TYPE_SUFFIX.get(chart_type, "")
         if suffix and suffix not in title:
             title = f"{title} - {suffix}"
 
@@ -437,14 +464,18 @@ class VisualizationAgent:
             if not values:
                 return insights
 
+            # 一次转换为数组, 极值和位置由 NumPy 在C层面计算
+            arr = np.asarray(values, dtype=np.float64)
+            first, last = float(arr[0]), float(arr[-1])
+
             # 趋势洞察
-            if len(values) >= 2:
-                if values[-1] > values[0]:
+            if len(arr) >= 2:
+                if last > first:
                     trend = "上升"
-                    change = ((values[-1] - values[0]) / values[0]) * 100
-                elif values[-1] < values[0]:
+                    change = ((last - first) / first) * 100
+                elif last < first:
                     trend = "下降"
-                    change = ((values[0] - values[-1]) / values[0]) * 100
+                    change = ((first - last) / first) * 100
                 else:
                     trend = "持平"
                     change = 0
@@ -458,11 +489,11 @@ class VisualizationAgent:
                 ))
 
             # 极值洞察
-            if len(values) > 0:
-                max_val = max(values)
-                min_val = min(values)
-                max_idx = values.index(max_val)
-                min_idx = values.index(min_val)
+            if len(arr) > 0:
+                max_idx = int(arr.argmax())
+                min_idx = int(arr.argmin())
+                max_val = float(arr[max_idx])
+                min_val = float(arr[min_idx])
 
                 insights.append(VisualizationInsight(
                     insight_type="comparison",
@@ -483,16 +514,31 @@ class VisualizationAgent:
 
 # ==================== 工具函数 ====================
 
+# 工具调用共用的 VisualizationAgent(见 _get_viz_agent)
+_VIZ_AGENT: Optional[VisualizationAgent] = None
+
+
+def _get_viz_agent() -> VisualizationAgent:
+    """获取共用的 VisualizationAgent, Settings.llm 被替换时重新创建"""
+    global _VIZ_AGENT
+    llm = Settings.llm
+    if _VIZ_AGENT is None or _VIZ_AGENT.llm is not llm:
+        _VIZ_AGENT = VisualizationAgent(llm)
+    return _VIZ_AGENT
+
+
 async def generate_visualization_for_query(
     query: Annotated[str, "用户查询"],
     answer: Annotated[str, "文本回答"],
     data: Annotated[Optional[Dict[str, Any]], "原始数据"] = None,
     sources: Annotated[Optional[List[Dict]], "数据来源"] = None
-) -> Dict[str, Any]:
+) -> str:
     """
     为查询生成可视化
 
-    这是一个可以被Agent调用的工具函数
+    这是一个可以被Agent调用的工具函数。
+    结果直接编码为 JSON 字符串, 既作为工具输出交给 LLM,
+    也由 ReportAgent 原样放入查询结果, 不再重复序列化。
 
     Args:
         query: 用户查询
@@ -501,28 +547,25 @@ async def generate_visualization_for_query(
         sources: 数据来源（可选）
 
     Returns:
-        Dict: 可视化响应
+        str: 可视化响应(VisualizationResponse)的 JSON 字符串
     """
     try:
         logger.info(f"工具调用: 生成可视化 - {query[:50]}...")
 
-        viz_agent = VisualizationAgent()
-        result = await viz_agent.generate_visualization(
+        result = await _get_viz_agent().generate_visualization(
             query=query,
             answer=answer,
             data=data,
             sources=sources
         )
 
-        # 使用 model_dump() 而不是 dict() (Pydantic v2)
-        return result.model_dump()
+        return result.model_dump_json()
 
     except Exception as e:
         logger.error(f"❌ 可视化工具调用失败: {str(e)}")
-        return {
+        return json.dumps({
             "query": query,
             "answer": answer,
             "has_visualization": False,
             "error": str(e)
-        }
-
+        }, ensure_ascii=False)
@@ -5,54 +5,118 @@ Agent API 接口
 
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 import logging
 import asyncio
+import functools
+import json
 from pathlib import Path
 
+from config import settings
 from core.rag_engine import RAGEngine
-from agents.report_agent import ReportAgent
+from core.section_cache import create_section_store
+from core.semantic_cache import SemanticLSHCache
+from agents.report_agent import ReportAgent, SECTION_FN_MAP
 from agents.template_renderer import TemplateRenderer
 from models.report_models import ReportGenerationStatus
 
+# 报告/查询结果体积较大, 安装了 orjson 时用它序列化响应
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as ReportJSONResponse
+except ImportError:
+    orjson = None
+    ReportJSONResponse = JSONResponse
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/agent", tags=["agent"])
 
-# 全局实例(延迟初始化)
-rag_engine = None
-report_agent = None
-template_renderer = None
 
+def _sse_data(event: Dict[str, Any]) -> str:
+    """将事件编码为一条 SSE 消息"""
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(
+                event, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            ).decode('utf-8')
+            return f"data: {payload}\n\n"
+        except TypeError:
+            pass
+    return f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+# 全局实例: 首次调用时创建并缓存(启动时由 warm_up 预先创建)
+@functools.lru_cache(maxsize=None)
 def get_rag_engine():
-    """获取 RAG 引擎实例"""
-    global rag_engine
-    if rag_engine is None:
-        rag_engine = RAGEngine()
-    return rag_engine
+    """获取 RAG 引擎实例(query / process 路由共用同一个实例, 索引只加载一次)"""
+    return RAGEngine()
 
+@functools.lru_cache(maxsize=None)
 def get_report_agent():
-    """获取 Report Agent 实例"""
-    global report_agent
-    if report_agent is None:
-        rag = get_rag_engine()
-        if not rag.query_engine:
-            # 尝试加载现有索引
-            if not rag.load_existing_index():
-                raise HTTPException(
-                    status_code=500,
-                    detail="RAG 引擎未初始化,请先上传并处理文档"
-                )
-        report_agent = ReportAgent(rag.query_engine)
-    return report_agent
+    """获取 Report Agent 实例(索引未就绪时抛出异常, 不缓存, 下次调用重试)"""
+    rag = get_rag_engine()
+    if not rag.query_engine:
+        # 尝试加载现有索引
+        if not rag.load_existing_index():
+            raise HTTPException(
+                status_code=500,
+                detail="RAG 引擎未初始化,请先上传并处理文档"
+            )
+    return ReportAgent(
+        rag.query_engine,
+        section_store=get_section_store(),
+        query_cache=get_query_cache(),
+        embed_fn=rag.aembed,
+        fast_fallback=settings.REPORT_FAST_FALLBACK
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_section_store():
+    """获取章节缓存的持久化存储(memory 后端时为 None), 创建失败时退回进程内缓存"""
+    if settings.SECTION_CACHE_BACKEND == "memory":
+        return None
+    try:
+        return create_section_store(
+            settings.SECTION_CACHE_BACKEND,
+            settings.SECTION_CACHE_TTL,
+            sqlite_path=settings.SECTION_CACHE_SQLITE_PATH,
+            redis_url=settings.REDIS_URL
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ 章节缓存存储初始化失败, 仅使用内存缓存: {str(e)}")
+        return None
+
+@functools.lru_cache(maxsize=None)
+def get_query_cache():
+    """获取 Agent 查询的语义缓存, SEMANTIC_CACHE_THRESHOLD 大于 1 时不启用(返回 None)"""
+    if settings.SEMANTIC_CACHE_THRESHOLD > 1:
+        return None
+    return SemanticLSHCache(
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds=settings.SEMANTIC_CACHE_TTL
+    )
 
+@functools.lru_cache(maxsize=None)
 def get_template_renderer():
     """获取模板渲染器实例"""
-    global template_renderer
-    if template_renderer is None:
-        template_renderer = TemplateRenderer()
-    return template_renderer
+    return TemplateRenderer()
+
+def _initialized(getter) -> bool:
+    """getter 对应的实例是否已创建"""
+    return getter.cache_info().currsize > 0
+
+def warm_up():
+    """
+    启动时预先创建 RAG 引擎、模板渲染器和 Agent, 避免第一个请求承担初始化开销
+    
+    尚无索引时不创建 Agent, 上传并处理文档后由第一个 Agent 请求创建
+    """
+    get_template_renderer()
+    rag = get_rag_engine()
+    if rag.query_engine or rag.load_existing_index():
+        get_report_agent()
 
 
 # ==================== 请求/响应模型 ====================
@@ -118,7 +182,7 @@ async def generate_report(request: GenerateReportRequest, background_tasks: Back
                     output_path
                 )
         
-        return JSONResponse(content={
+        return ReportJSONResponse(content={
             "status": "success",
             "company_name": request.company_name,
             "year": request.year,
@@ -143,7 +207,7 @@ async def generate_section(request: GenerateSectionRequest):
         logger.info(f"收到生成章节请求: {request.section_name}")
         
         # 验证章节名称
-        valid_sections = ["financial_review", "business_guidance", "business_highlights", "profit_forecast"]
+        valid_sections = list(SECTION_FN_MAP)
         if request.section_name not in valid_sections:
             raise HTTPException(
                 status_code=400,
@@ -163,7 +227,7 @@ async def generate_section(request: GenerateSectionRequest):
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["error"])
         
-        return JSONResponse(content=result)
+        return ReportJSONResponse(content=result)
         
     except HTTPException:
         raise
@@ -185,13 +249,10 @@ async def agent_query(request: AgentQueryRequest):
         # 获取 Agent
         agent = get_report_agent()
         
-        # 执行查询
-        result = await agent.query(request.question)
+        # 执行查询(结果已编码为 JSON, 直接作为响应体, 查询失败时抛出异常)
+        content = await agent.query_json(request.question)
         
-        if result["status"] == "error":
-            raise HTTPException(status_code=500, detail=result["error"])
-        
-        return JSONResponse(content=result)
+        return Response(content=content, media_type="application/json")
         
     except HTTPException:
         raise
@@ -200,6 +261,29 @@ async def agent_query(request: AgentQueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/query-stream")
+async def agent_query_stream(request: AgentQueryRequest):
+    """
+    Agent 流式查询接口 (Server-Sent Events)
+    
+    每个工具调用结果产生后立即推送(type=tool_result), 最后推送回答(type=answer)
+    """
+    logger.info(f"收到 Agent 流式查询: {request.question[:50]}...")
+    
+    # 获取 Agent(未初始化时直接返回错误状态码)
+    agent = get_report_agent()
+    
+    async def event_source():
+        try:
+            async for event in agent.query_stream(request.question):
+                yield _sse_data(event)
+        except Exception as e:
+            logger.error(f"❌ Agent 流式查询失败: {str(e)}")
+            yield _sse_data({'type': 'error', 'error': str(e)})
+    
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+
 @router.get("/status")
 async def agent_status():
     """
@@ -220,19 +304,21 @@ async def agent_status():
             index_loaded = rag.load_existing_index()
 
         status = {
-            "rag_engine_initialized": rag_engine is not None,
-            "report_agent_initialized": report_agent is not None,
-            "template_renderer_initialized": template_renderer is not None,
+            "rag_engine_initialized": _initialized(get_rag_engine),
+            "report_agent_initialized": _initialized(get_report_agent),
+            "template_renderer_initialized": _initialized(get_template_renderer),
             "index_loaded": index_loaded,
             "ready": index_loaded
         }
+        if _initialized(get_report_agent):
+            status["fast_report_stats"] = dict(get_report_agent().fast_report_stats)
 
         if not index_loaded:
             status["message"] = "请先上传并处理文档以初始化 RAG 引擎"
         else:
             status["message"] = "Agent 系统已就绪"
             # 如果索引已加载,尝试初始化 Agent
-            if report_agent is None:
+            if not _initialized(get_report_agent):
                 try:
                     get_report_agent()
                     status["report_agent_initialized"] = True
@@ -283,7 +369,7 @@ async def render_template(report_data: Dict[str, Any], template_name: str = "ann
         renderer = get_template_renderer()
         rendered = renderer.render_report(report_data, template_name)
         
-        return JSONResponse(content={
+        return ReportJSONResponse(content={
             "status": "success",
             "template": template_name,
             "rendered": rendered
@@ -7,33 +7,44 @@ from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+import functools
 import logging
 
 from core.document_processor import DocumentProcessor
 from core.table_extractor import TableExtractor
-from core.rag_engine import RAGEngine
+from api.agent import get_rag_engine, get_report_agent, get_query_cache, get_section_store
+from agents.report_agent import clear_section_caches
+from agents.report_tools import clear_retrieval_caches
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/process", tags=["process"])
 
-# 全局处理器实例（延迟初始化）
-document_processor = None
-table_extractor = None
-rag_engine = None
-
+# 全局处理器实例（首次调用时创建, 启动时由 warm_up 预先创建）
+@functools.lru_cache(maxsize=None)
 def get_processors():
-    """获取处理器实例（延迟初始化）"""
-    global document_processor, table_extractor, rag_engine
+    """获取处理器实例: (文档处理器, 表格提取器, RAG引擎), RAG 引擎与其他路由共用"""
+    return DocumentProcessor(), TableExtractor(), get_rag_engine()
 
-    if document_processor is None:
-        document_processor = DocumentProcessor()
-    if table_extractor is None:
-        table_extractor = TableExtractor()
-    if rag_engine is None:
-        rag_engine = RAGEngine()
+def warm_up():
+    """启动时预先创建处理器实例, 避免第一个处理请求承担初始化开销"""
+    get_processors()
 
-    return document_processor, table_extractor, rag_engine
+def invalidate_caches():
+    """
+    索引变化后清空 Agent 查询的语义缓存、检索缓存和章节缓存, 避免返回基于旧索引的结果
+    
+    ReportAgent 创建时绑定了当时的查询引擎, 一并丢弃, 下一个 Agent 请求按新索引重新创建
+    """
+    get_report_agent.cache_clear()
+    cache = get_query_cache()
+    if cache is not None:
+        cache.clear()
+    clear_retrieval_caches()
+    try:
+        clear_section_caches(get_section_store())
+    except Exception as e:
+        logger.warning(f"⚠️ 清空章节缓存失败: {str(e)}")
 
 class ProcessRequest(BaseModel):
     filename: str
@@ -84,6 +95,7 @@ async def process_file(request: ProcessRequest):
         if build_index:
             try:
                 index_built = rag_engine.build_index(processed_docs, extracted_tables)
+                invalidate_caches()
                 logger.info(f"索引构建{'成功' if index_built else '失败'}")
             except Exception as e:
                 logger.warning(f"索引构建失败: {str(e)}")
@@ -167,6 +179,9 @@ async def process_multiple_files(request: ProcessMultipleRequest):
         
         logger.info(f"开始批量处理 {len(filenames)} 个文件")
         
+        # 获取处理器实例
+        document_processor, table_extractor, rag_engine = get_processors()
+        
         results = []
         all_processed_docs = {}
         all_extracted_tables = {}
@@ -231,6 +246,7 @@ async def process_multiple_files(request: ProcessMultipleRequest):
         if build_index and all_processed_docs:
             try:
                 index_built = rag_engine.build_index(all_processed_docs, all_extracted_tables)
+                invalidate_caches()
                 logger.info(f"统一索引构建{'成功' if index_built else '失败'}")
             except Exception as e:
                 logger.warning(f"统一索引构建失败: {str(e)}")
@@ -282,6 +298,7 @@ async def get_processing_status():
             uploaded_files = len([f for f in upload_dir.iterdir() if f.is_file()])
         
         # 获取索引状态
+        _, _, rag_engine = get_processors()
         index_stats = rag_engine.get_index_stats()
         
         status = {
@@ -308,8 +325,11 @@ async def rebuild_index():
         重建结果
     """
     try:
+        document_processor, table_extractor, rag_engine = get_processors()
+        
         # 清空现有索引
         rag_engine.clear_index()
+        invalidate_caches()
         
         # 获取所有已处理的文档（这里简化处理，实际应该从存储中恢复）
         upload_dir = Path("uploads")
@@ -344,6 +364,7 @@ async def rebuild_index():
         # 构建索引
         if all_processed_docs:
             index_built = rag_engine.build_index(all_processed_docs, all_extracted_tables)
+            invalidate_caches()
             
             if index_built:
                 index_stats = rag_engine.get_index_stats()
@@ -8,22 +8,25 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import logging
 
-from core.rag_engine import RAGEngine
+from api.agent import get_rag_engine
 from agents.visualization_agent import VisualizationAgent
 
+# 查询结果(含来源与图表数据)体积较大, 安装了 orjson 时用它序列化响应
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as QueryJSONResponse
+except ImportError:
+    QueryJSONResponse = JSONResponse
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/query", tags=["query"])
 
-# 全局RAG引擎实例（延迟初始化）
-rag_engine = None
-
-def get_rag_engine():
-    """获取RAG引擎实例（延迟初始化）"""
-    global rag_engine
-    if rag_engine is None:
-        rag_engine = RAGEngine()
-    return rag_engine
+def warm_up():
+    """启动时预先创建RAG引擎并加载已有索引, 避免第一个查询承担初始化开销"""
+    rag = get_rag_engine()
+    if not rag.query_engine:
+        rag.load_existing_index()
 
 class QueryRequest(BaseModel):
     question: str
@@ -98,7 +101,7 @@ async def ask_question(request: QueryRequest):
                 }
 
         logger.info(f"查询完成: {question[:50]}...")
-        return JSONResponse(status_code=200, content=response)
+        return QueryJSONResponse(status_code=200, content=response)
 
     except HTTPException:
         raise
@@ -134,6 +137,7 @@ async def batch_query(request: BatchQueryRequest):
         
         logger.info(f"收到批量查询: {len(questions)} 个问题")
         
+        rag_engine = get_rag_engine()
         results = []
         for i, question in enumerate(questions):
             try:
@@ -179,7 +183,7 @@ async def batch_query(request: BatchQueryRequest):
         }
         
         logger.info(f"批量查询完成: {success_count}/{len(questions)} 成功")
-        return JSONResponse(status_code=200, content=response)
+        return QueryJSONResponse(status_code=200, content=response)
         
     except HTTPException:
         raise
@@ -209,7 +213,7 @@ async def get_similar_content(request: SimilarContentRequest):
         logger.info(f"获取相似内容: {query[:50]}...")
         
         # 获取相似内容
-        similar_content = rag_engine.get_similar_content(query, request.top_k)
+        similar_content = get_rag_engine().get_similar_content(query, request.top_k)
         
         response = {
             "query": query,
@@ -219,7 +223,7 @@ async def get_similar_content(request: SimilarContentRequest):
         }
         
         logger.info(f"相似内容查询完成: 找到 {len(similar_content)} 个结果")
-        return JSONResponse(status_code=200, content=response)
+        return QueryJSONResponse(status_code=200, content=response)
         
     except HTTPException:
         raise
@@ -307,7 +311,7 @@ async def get_query_stats():
     """
     try:
         # 获取索引统计
-        index_stats = rag_engine.get_index_stats()
+        index_stats = get_rag_engine().get_index_stats()
         
         stats = {
             "index_status": index_stats,
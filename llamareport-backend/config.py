@@ -56,6 +56,22 @@ class Config:
     # 查询配置
     SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", 5))
     
+    # 章节缓存配置 (memory / sqlite / redis)
+    SECTION_CACHE_BACKEND = os.getenv("SECTION_CACHE_BACKEND", "memory")
+    SECTION_CACHE_TTL = int(os.getenv("SECTION_CACHE_TTL", 600))
+    SECTION_CACHE_SQLITE_PATH = str(STORAGE_DIR / "section_cache.sqlite3")
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    
+    # Agent 查询语义缓存配置(相似度不低于阈值的问题复用已有结果)
+    # 默认关闭(阈值大于 1); 开启时建议 0.95-0.98, 年份/公司不同的问题不会互相命中
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 2))
+    SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", 600))
+    
+    # 快速生成报告的单次调用失败时是否退回逐章节生成
+    # 退回时已花费的单次调用作废, 再进行四次章节调用和一次总结调用, LLM 成本和耗时约为正常的两倍;
+    # 关闭后单次调用失败直接返回错误
+    REPORT_FAST_FALLBACK = os.getenv("REPORT_FAST_FALLBACK", "true").lower() == "true"
+    
     @classmethod
     def validate(cls):
         """验证必要的配置项"""
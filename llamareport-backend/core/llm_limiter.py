@@ -0,0 +1,91 @@
+"""
+LLM 调用限流与重试
+限制同时进行的 LLM 调用数, 并对限流/超时等临时错误做带随机抖动的指数退避重试,
+避免并发生成章节时触发服务商限流(429), 或因一次临时失败导致整份报告失败
+"""
+
+import asyncio
+import logging
+import os
+import weakref
+
+from tenacity import (
+    AsyncRetrying,
+    before_sleep_log,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential
+)
+
+try:
+    from openai import APIConnectionError, APITimeoutError, RateLimitError
+    RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, asyncio.TimeoutError)
+except ImportError:  # 未使用 OpenAI 兼容客户端时只重试超时
+    RETRYABLE_ERRORS = (asyncio.TimeoutError,)
+
+logger = logging.getLogger(__name__)
+
+# 同时进行的 LLM 调用数上限
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+
+# 每次调用最多尝试的次数(含第一次)
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", 4))
+
+# 每个事件循环一个信号量(Semaphore 不能跨事件循环使用)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """获取当前事件循环的 LLM 调用信号量"""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(LLM_CONCURRENCY)
+    return semaphore
+
+
+def _retrying() -> AsyncRetrying:
+    """LLM 调用的重试策略: 仅重试临时错误, 带随机抖动的指数退避"""
+    return AsyncRetrying(
+        stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
+        wait=wait_random_exponential(min=1, max=16),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True
+    )
+
+
+async def call_llm(fn, *args, **kwargs):
+    """
+    限流并重试地调用 LLM 协程函数
+
+    Args:
+        fn: LLM 协程函数, 如 sllm.achat、llm.achat
+        *args, **kwargs: 传给 fn 的参数
+
+    Returns:
+        fn 的返回值; 重试次数用尽或遇到不可重试的错误时抛出原异常
+    """
+    async with _get_semaphore():
+        async for attempt in _retrying():
+            with attempt:
+                return await fn(*args, **kwargs)
+
+
+async def stream_llm(fn, *args, **kwargs):
+    """
+    限流地流式调用 LLM, 逐个产出流中的元素
+
+    整个流被消费期间占用一个并发名额; 只重试建立流的过程, 开始输出后出错直接抛出。
+    调用方提前结束消费时应使用 contextlib.aclosing, 以便及时释放名额。
+
+    Args:
+        fn: 返回异步生成器的 LLM 协程函数, 如 sllm.astream_chat
+        *args, **kwargs: 传给 fn 的参数
+    """
+    async with _get_semaphore():
+        async for attempt in _retrying():
+            with attempt:
+                stream = await fn(*args, **kwargs)
+        async for item in stream:
+            yield item
@@ -571,6 +571,34 @@ class RAGEngine:
         
         return sources
     
+    def warm_up(self) -> bool:
+        """
+        执行一次检索(只检索, 不调用 LLM), 提前建立嵌入模型连接并加载向量库数据
+
+        Returns:
+            是否预热成功(尚无索引时返回 False)
+        """
+        if not self.index:
+            return False
+        try:
+            self.index.as_retriever(similarity_top_k=1).retrieve("warmup")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ 检索预热失败: {str(e)}")
+            return False
+
+    async def aembed(self, text: str) -> List[float]:
+        """
+        使用索引所用的嵌入模型计算查询文本的向量(语义缓存等场景使用)
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            向量
+        """
+        return await Settings.embed_model.aget_query_embedding(text)
+
     def get_similar_content(self, query: str, top_k: int = 5) -> List[Dict]:
         """获取相似内容"""
         try:
@@ -0,0 +1,208 @@
+"""
+章节结果缓存
+内存 LRU + TTL 缓存, 可选 SQLite / Redis 持久化存储作为第二层,
+使服务重启或多进程部署时仍能复用已生成的报告章节
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，缺失时使用标准库json
+    orjson = None
+
+try:
+    import redis
+except ImportError:  # 可选依赖，仅 redis 缓存后端需要
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# 缓存未命中标记(章节结果本身可能是任意值)
+MISSING = object()
+
+# 支持的缓存后端
+CACHE_BACKENDS = ("memory", "sqlite", "redis")
+
+
+def _encode_key(key: Tuple) -> str:
+    """将内存缓存使用的元组键转换为持久化存储的字符串键"""
+    return json.dumps(list(key), ensure_ascii=False)
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def _loads(payload: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class SQLiteSectionStore:
+    """基于 SQLite 的章节结果存储(同一台机器上的多个进程共享)"""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS section_cache ("
+                "key TEXT PRIMARY KEY, payload BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._prune()
+
+    def get(self, key: Tuple) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM section_cache WHERE key = ? AND created_at > ?",
+                (_encode_key(key), time.time() - self.ttl_seconds)
+            ).fetchone()
+        return MISSING if row is None else _loads(row[0])
+
+    def set(self, key: Tuple, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO section_cache (key, payload, created_at) VALUES (?, ?, ?)",
+                (_encode_key(key), _dumps(value), time.time())
+            )
+            self._prune()
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM section_cache")
+
+    def _prune(self) -> None:
+        """删除已过期的记录(调用方持有锁并处于事务中), 避免数据库无限增长"""
+        self._conn.execute(
+            "DELETE FROM section_cache WHERE created_at <= ?",
+            (time.time() - self.ttl_seconds,)
+        )
+
+
+class RedisSectionStore:
+    """基于 Redis 的章节结果存储(多台机器共享), 过期由 Redis 负责"""
+
+    def __init__(self, url: str, ttl_seconds: float, prefix: str = "section_cache:"):
+        if redis is None:
+            raise ImportError("redis 缓存后端需要安装 redis: pip install redis")
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: Tuple) -> Any:
+        payload = self._client.get(self.prefix + _encode_key(key))
+        return MISSING if payload is None else _loads(payload)
+
+    def set(self, key: Tuple, value: Any) -> None:
+        self._client.set(self.prefix + _encode_key(key), _dumps(value), ex=int(self.ttl_seconds))
+
+    def clear(self) -> None:
+        keys = list(self._client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+
+class SectionCache:
+    """
+    线程安全的 LRU + TTL 缓存, 保存已生成的章节结果
+
+    键为 (章节函数名, 公司名称, 年份)。重新生成报告或单独重试某个章节时,
+    TTL 内的相同请求直接复用结果, 不再重复检索和调用 LLM。
+    配置了持久化存储时, 内存未命中会再查存储, 写入时两层同时写入。
+    """
+
+    def __init__(self, capacity: int = 256, ttl_seconds: float = 600, store=None):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: Tuple) -> Any:
+        """读取缓存, 未命中或已过期时返回 MISSING"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at >= time.monotonic():
+                    self._data.move_to_end(key)
+                    return value
+                del self._data[key]
+
+        if self.store is None:
+            return MISSING
+
+        # 持久化存储出错时按未命中处理, 不影响报告生成
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取章节缓存存储失败: {str(e)}")
+            return MISSING
+        if value is not MISSING:
+            self._set_memory(key, value)
+        return value
+
+    def set(self, key: Tuple, value: Any) -> None:
+        """写入缓存, 超出容量时淘汰最久未使用的条目"""
+        self._set_memory(key, value)
+        if self.store is not None:
+            try:
+                self.store.set(key, value)
+            except Exception as e:
+                logger.warning(f"⚠️ 写入章节缓存存储失败: {str(e)}")
+
+    def clear(self) -> None:
+        """清空缓存(包括持久化存储)"""
+        with self._lock:
+            self._data.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def _set_memory(self, key: Tuple, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+
+def create_section_store(
+    backend: str,
+    ttl_seconds: float,
+    sqlite_path: Optional[str] = None,
+    redis_url: Optional[str] = None
+):
+    """
+    创建章节缓存的持久化存储
+
+    Args:
+        backend: 缓存后端: memory(不持久化), sqlite, redis
+        ttl_seconds: 过期时间(秒)
+        sqlite_path: SQLite 数据库文件路径(sqlite 后端)
+        redis_url: Redis 连接地址(redis 后端)
+
+    Returns:
+        存储实例, memory 后端返回 None
+    """
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"无效的缓存后端: {backend}。有效值: {', '.join(CACHE_BACKENDS)}")
+
+    if backend == "sqlite":
+        return SQLiteSectionStore(sqlite_path, ttl_seconds)
+    if backend == "redis":
+        return RedisSectionStore(redis_url, ttl_seconds)
+    return None
@@ -0,0 +1,177 @@
+"""
+语义查询缓存
+以问题的向量表示为键缓存查询结果, 措辞不同但语义几乎相同的问题直接复用已有结果。
+使用随机投影 LSH 分桶, 只对同桶的候选计算余弦相似度, 查找开销与缓存大小基本无关。
+年份、公司、指标等关键词必须完全一致才会命中(见 extract_guard_tokens)
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set
+
+import numpy as np
+
+from core.section_cache import MISSING
+
+# 财务问题中只差年份、公司或指标的两个问题向量往往非常接近, 这些关键词需精确匹配
+_GUARD_RES = (
+    # 年份
+    re.compile(r'(?<!\d)(?:19|20)\d{2}(?!\d)'),
+    # 股票代码
+    re.compile(r'(?<!\d)\d{6}(?!\d)'),
+    # 带常见后缀的公司名称
+    re.compile(r'[\u4e00-\u9fa5]{2,12}?(?:股份有限公司|有限公司|集团|公司|银行|证券|保险|控股|股份)'),
+    # 英文简称/股票简称
+    re.compile(r'[A-Za-z][A-Za-z&.]+'),
+    # 财务指标
+    re.compile(
+        r'营业总?收入|营收|营业成本|毛利率?|净利率|营业利润|利润总额|扣非净利润|归母净利润|净利润|'
+        r'每股收益|EPS|ROE|ROA|净资产收益率|总资产|总负债|净资产|资产负债率|'
+        r'经营活动现金流|投资活动现金流|筹资活动现金流|现金流|市盈率|市净率|股息|分红|研发'
+    ),
+)
+
+
+def extract_guard_tokens(text: str) -> FrozenSet[str]:
+    """
+    提取问题中需要精确匹配的关键词(年份、股票代码、公司名称、英文简称、财务指标)
+
+    两个问题的关键词集合不同时, 即使向量相似度超过阈值也不会互相命中
+    """
+    return frozenset(token for pattern in _GUARD_RES for token in pattern.findall(text))
+
+
+class SemanticLSHCache:
+    """
+    基于随机投影 LSH 的语义缓存(LRU + TTL)
+
+    每张哈希表有一个高斯随机投影矩阵, 向量投影后各维度的符号组成 hash_bits 位签名,
+    作为该表的桶键。查找时汇总所有表中同桶的条目, 按余弦相似度取最相近的一个,
+    相似度不低于 threshold 时命中。多张表降低相似问题恰好落在不同桶中的概率。
+    """
+
+    def __init__(
+        self,
+        hash_bits: int = 16,
+        tables: int = 8,
+        threshold: float = 0.95,
+        capacity: int = 1024,
+        ttl_seconds: float = 600,
+        seed: int = 0
+    ):
+        """
+        Args:
+            hash_bits: 每张表的签名位数(位数越多, 桶越细)
+            tables: 哈希表数量
+            threshold: 命中所需的最低余弦相似度
+            capacity: 最多缓存的条目数, 超出时淘汰最久未使用的条目
+            ttl_seconds: 过期时间(秒)
+            seed: 随机投影的随机种子
+        """
+        if not 0 < hash_bits <= 64:
+            raise ValueError("hash_bits 必须在 1-64 之间")
+        self.hash_bits = hash_bits
+        self.tables = tables
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._rng = np.random.default_rng(seed)
+        self._weights = np.left_shift(np.uint64(1), np.arange(hash_bits, dtype=np.uint64))
+        # 投影矩阵 (tables, dim, hash_bits), 向量维度在第一次使用时确定
+        self._projections: Optional[np.ndarray] = None
+        # 条目 id -> (单位向量, 各表签名, 精确匹配关键词, 过期时间, 缓存值)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # 每张表: 签名 -> 条目 id 集合
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in range(tables)]
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def get(self, embedding: Sequence[float], guard: FrozenSet[str] = frozenset()) -> Any:
+        """
+        查找与 embedding 足够相似的缓存结果, 未命中时返回 MISSING
+
+        Args:
+            embedding: 问题向量
+            guard: 必须完全一致的关键词集合(见 extract_guard_tokens)
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._projections is None or self._projections.shape[1] != vector.shape[0]:
+                return MISSING
+
+            candidates = set()
+            for table, signature in zip(self._buckets, self._signatures(vector)):
+                candidates.update(table.get(signature, ()))
+            if not candidates:
+                return MISSING
+
+            now = time.monotonic()
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                entry_vector, _, entry_guard, expires_at, _ = self._entries[entry_id]
+                if expires_at < now:
+                    self._remove(entry_id)
+                    continue
+                if entry_guard != guard:
+                    continue
+                score = float(entry_vector @ vector)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                return MISSING
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][4]
+
+    def put(self, embedding: Sequence[float], value: Any, guard: FrozenSet[str] = frozenset()) -> None:
+        """写入缓存, 超出容量时淘汰最久未使用的条目"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._projections is None or self._projections.shape[1] != vector.shape[0]:
+                # 向量维度变化(如更换了 embedding 模型)时旧条目已无法比较, 整体重建
+                self._reset(vector.shape[0])
+
+            signatures = self._signatures(vector)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (vector, signatures, guard, time.monotonic() + self.ttl_seconds, value)
+            for table, signature in zip(self._buckets, signatures):
+                table.setdefault(signature, set()).add(entry_id)
+
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets = [{} for _ in range(self.tables)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _signatures(self, vector: np.ndarray) -> List[int]:
+        """计算向量在每张表中的签名"""
+        bits = np.einsum('d,tdb->tb', vector, self._projections) > 0
+        return [int(signature) for signature in (bits.astype(np.uint64) * self._weights).sum(axis=1)]
+
+    def _reset(self, dim: int) -> None:
+        self._projections = self._rng.standard_normal((self.tables, dim, self.hash_bits)).astype(np.float32)
+        self.clear()
+
+    def _remove(self, entry_id: int) -> None:
+        _, signatures, _, _, _ = self._entries.pop(entry_id)
+        for table, signature in zip(self._buckets, signatures):
+            bucket = table.get(signature)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[signature]
@@ -4,6 +4,7 @@ LlamaReport Backend - 简化版财务报告分析后端
 """
 
 import os
+import asyncio
 import logging
 from pathlib import Path
 from fastapi import FastAPI, HTTPException
@@ -17,6 +18,7 @@ from api.upload import router as upload_router
 from api.process import router as process_router
 from api.query import router as query_router
 from api.agent import router as agent_router
+from api import agent as agent_api, process as process_api, query as query_api
 from config import settings
 
 # 配置日志
@@ -31,6 +33,19 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def warm_up_services():
+    """预先创建各接口使用的处理器、RAG 引擎和 Agent 并加载已有索引, 单个服务失败不影响启动"""
+    for name, warm_up in (
+        ("文档处理", process_api.warm_up),
+        ("问答", query_api.warm_up),
+        ("Agent", agent_api.warm_up),
+    ):
+        try:
+            warm_up()
+            logger.info(f"✅ {name}服务预热完成")
+        except Exception as e:
+            logger.warning(f"⚠️ {name}服务预热失败: {str(e)}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
@@ -61,6 +76,14 @@ async def lifespan(app: FastAPI):
         logger.info(f"✅ 对话模型: DeepSeek ({os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')})")
         logger.info(f"✅ 嵌入模型: OpenAI (text-embedding-3-small)")
     
+    # 预热: 第一个请求到来前完成初始化和索引加载
+    await asyncio.to_thread(warm_up_services)
+    
+    # 执行一次检索预热嵌入模型连接(需要网络, 在后台执行, 不阻塞启动)
+    app.state.retrieval_warm_up = asyncio.create_task(
+        asyncio.to_thread(agent_api.get_rag_engine().warm_up)
+    )
+    
     logger.info("✅ LlamaReport Backend 启动完成")
     
     yield
@@ -128,6 +128,27 @@ class TableChart(BaseModel):
     column_widths: Optional[List[int]] = Field(default=None, description="列宽")
 
 
+# ==================== 数据提取模型 ====================
+
+class VisualizationExtraction(BaseModel):
+    """从回答中提取的可视化数据及图表建议(一次结构化输出)"""
+    has_data: bool = Field(description="是否包含可视化数据")
+    data_type: Optional[Literal["time_series", "comparison", "distribution", "single_value", "table"]] = Field(
+        default=None,
+        description="数据类型"
+    )
+    labels: List[str] = Field(default_factory=list, description="标签列表")
+    values: List[float] = Field(default_factory=list, description="与标签一一对应的数值列表")
+    series: Optional[List[Dict[str, Any]]] = Field(default=None, description="多系列数据")
+    unit: str = Field(default="", description="数值单位，如元、%、万等")
+    time_period: Optional[str] = Field(default=None, description="时间周期（时间序列数据）")
+    recommended_chart_type: Optional[Literal[ChartType.BAR, ChartType.LINE, ChartType.PIE]] = Field(
+        default=None,
+        description="推荐的图表类型: bar(对比), line(趋势), pie(占比)"
+    )
+    chart_title: Optional[str] = Field(default=None, description="简洁的图表标题")
+
+
 # ==================== 智能图表推荐模型 ====================
 
 class ChartRecommendation(BaseModel):
@@ -201,6 +201,13 @@ async def main():
 
 
 if __name__ == "__main__":
+    # uvloop 可选; 服务端由 uvicorn(loop=auto) 自动选用, 这里是独立脚本需自行安装
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
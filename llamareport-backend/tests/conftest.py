@@ -0,0 +1,9 @@
+"""
+测试公共配置
+后端模块以 core.*、agents.* 等形式导入, 将后端目录加入 sys.path
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
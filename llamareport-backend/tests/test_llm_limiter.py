@@ -0,0 +1,53 @@
+"""
+LLM 调用限流与重试测试
+"""
+
+import asyncio
+
+import pytest
+from tenacity import wait_none
+
+from core import llm_limiter
+from core.llm_limiter import call_llm
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """测试中不等待退避时间"""
+    monkeypatch.setattr(llm_limiter, "wait_random_exponential", lambda **kwargs: wait_none())
+
+
+def _flaky(errors):
+    """依次抛出 errors 中的异常, 之后返回 "ok"; calls 记录调用次数"""
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    return fn, calls
+
+
+def test_non_transient_error_not_retried():
+    """不可重试的错误直接抛出, 只调用一次"""
+    fn, calls = _flaky([ValueError("bad output")])
+    with pytest.raises(ValueError):
+        asyncio.run(call_llm(fn))
+    assert len(calls) == 1
+
+
+def test_transient_error_retried():
+    """超时等临时错误重试后成功"""
+    fn, calls = _flaky([asyncio.TimeoutError(), asyncio.TimeoutError()])
+    assert asyncio.run(call_llm(fn)) == "ok"
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_attempts():
+    """重试次数用尽后抛出原异常"""
+    fn, calls = _flaky([asyncio.TimeoutError()] * llm_limiter.LLM_MAX_ATTEMPTS)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_llm(fn))
+    assert len(calls) == llm_limiter.LLM_MAX_ATTEMPTS
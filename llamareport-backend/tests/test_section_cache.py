@@ -0,0 +1,56 @@
+"""
+章节结果缓存测试(内存缓存与 SQLite 存储)
+"""
+
+from core.section_cache import MISSING, SectionCache, SQLiteSectionStore
+
+KEY = ("generate_financial_review", "测试公司", "2023")
+
+
+def test_memory_hit_and_miss():
+    cache = SectionCache()
+    assert cache.get(KEY) is MISSING
+    cache.set(KEY, {"a": 1})
+    assert cache.get(KEY) == {"a": 1}
+
+
+def test_memory_expiry():
+    """过期条目按未命中处理"""
+    cache = SectionCache(ttl_seconds=-1)
+    cache.set(KEY, "value")
+    assert cache.get(KEY) is MISSING
+
+
+def test_memory_lru_eviction():
+    cache = SectionCache(capacity=2)
+    cache.set(("a",), 1)
+    cache.set(("b",), 2)
+    cache.get(("a",))
+    cache.set(("c",), 3)
+    assert cache.get(("b",)) is MISSING
+    assert cache.get(("a",)) == 1
+    assert cache.get(("c",)) == 3
+
+
+def test_sqlite_store_shared_between_caches(tmp_path):
+    """内存未命中时从持久化存储读取(如服务重启后)"""
+    store = SQLiteSectionStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=600)
+    SectionCache(store=store).set(KEY, {"a": 1})
+    assert SectionCache(store=store).get(KEY) == {"a": 1}
+
+
+def test_sqlite_store_expiry_and_prune(tmp_path):
+    """过期记录不会返回, 并在写入时被删除"""
+    store = SQLiteSectionStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=0)
+    store.set(KEY, "value")
+    assert store.get(KEY) is MISSING
+    assert store._conn.execute("SELECT COUNT(*) FROM section_cache").fetchone()[0] == 0
+
+
+def test_clear_includes_store(tmp_path):
+    store = SQLiteSectionStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=600)
+    cache = SectionCache(store=store)
+    cache.set(KEY, "value")
+    cache.clear()
+    assert cache.get(KEY) is MISSING
+    assert store.get(KEY) is MISSING
@@ -0,0 +1,92 @@
+"""
+语义查询缓存测试
+使用固定向量, 结果不依赖 embedding 模型
+"""
+
+import numpy as np
+
+from core.section_cache import MISSING
+from core.semantic_cache import SemanticLSHCache, extract_guard_tokens
+
+DIM = 32
+VECTOR = np.linspace(-1.0, 1.0, DIM)
+
+
+def _cache(**kwargs) -> SemanticLSHCache:
+    kwargs.setdefault("threshold", 0.95)
+    return SemanticLSHCache(**kwargs)
+
+
+def test_extract_guard_tokens():
+    """年份、股票代码、公司名称、英文简称和财务指标均被提取"""
+    tokens = extract_guard_tokens("贵州茅台股份有限公司(600519) 2023年 ROE 和净利润")
+    assert {"2023", "600519", "贵州茅台股份有限公司", "ROE", "净利润"} <= tokens
+
+
+def test_hit_same_question():
+    """相同向量和关键词命中"""
+    cache = _cache()
+    guard = extract_guard_tokens("2023年营业收入是多少")
+    cache.put(VECTOR, "answer", guard)
+    assert cache.get(VECTOR, guard) == "answer"
+
+
+def test_hit_near_duplicate():
+    """措辞不同但向量几乎相同的问题命中"""
+    cache = _cache()
+    guard = extract_guard_tokens("2023年营业收入是多少")
+    cache.put(VECTOR, "answer", guard)
+    assert cache.get(VECTOR * 1.001 + 1e-4, extract_guard_tokens("2023年的营业收入有多少?")) == "answer"
+
+
+def test_miss_when_year_differs():
+    """向量相同但年份不同时不命中"""
+    cache = _cache()
+    cache.put(VECTOR, "2022", extract_guard_tokens("2022年营业收入是多少"))
+    assert cache.get(VECTOR, extract_guard_tokens("2023年营业收入是多少")) is MISSING
+
+
+def test_miss_when_ticker_differs():
+    """向量相同但股票代码不同时不命中"""
+    cache = _cache()
+    cache.put(VECTOR, "600519", extract_guard_tokens("600519 2023年净利润"))
+    assert cache.get(VECTOR, extract_guard_tokens("000858 2023年净利润")) is MISSING
+
+
+def test_miss_below_threshold():
+    """相似度低于阈值时不命中"""
+    cache = _cache()
+    cache.put(VECTOR, "answer")
+    assert cache.get(-VECTOR) is MISSING
+
+
+def test_threshold_above_one_never_hits():
+    """阈值大于 1(默认配置, 即关闭)时相同向量也不命中"""
+    cache = _cache(threshold=2)
+    cache.put(VECTOR, "answer")
+    assert cache.get(VECTOR) is MISSING
+
+
+def test_expired_entry_is_removed():
+    """过期条目不命中并被移除"""
+    cache = _cache(ttl_seconds=-1)
+    cache.put(VECTOR, "answer")
+    assert cache.get(VECTOR) is MISSING
+    assert len(cache) == 0
+
+
+def test_capacity_evicts_least_recently_used():
+    """超出容量时淘汰最久未使用的条目"""
+    cache = _cache(capacity=1)
+    cache.put(VECTOR, "old", extract_guard_tokens("2022年"))
+    cache.put(VECTOR, "new", extract_guard_tokens("2023年"))
+    assert len(cache) == 1
+    assert cache.get(VECTOR, extract_guard_tokens("2022年")) is MISSING
+    assert cache.get(VECTOR, extract_guard_tokens("2023年")) == "new"
+
+
+def test_clear():
+    cache = _cache()
+    cache.put(VECTOR, "answer")
+    cache.clear()
+    assert cache.get(VECTOR) is MISSING
@@ -1,11 +1,11 @@
 import streamlit as st
-import os
 import json
 import pandas as pd
 import requests
 from utils.rag_system import RAGSystem
 from utils.data_visualizer import DataVisualizer
 from utils.state import init_state, init_processors
+from utils.app_config import get_app_config
 import logging
 
 # Configure logging
@@ -39,7 +39,7 @@ def show_qa_page():
         col1, col2, col3 = st.columns([1, 1, 1])
         with col2:
             if st.button("🚀 去上传文档", type="primary", use_container_width=True):
-                st.session_state.nav_page = "上传与处理"
+                st.query_params["p"] = "上传与处理"
                 st.rerun()
 
         return
@@ -81,8 +81,7 @@ def show_qa_page():
         return
     
     # Enhanced API key check
-    openai_key = os.getenv("OPENAI_API_KEY")
-    if not openai_key or openai_key == "default_key":
+    if not get_app_config().has_openai_key:
         st.markdown("""
         <div style="background: #f8d7da; color: #721c24; padding: 2rem; border-radius: 12px; border-left: 4px solid #f5c6cb; text-align: center;">
             <h3 style="margin: 0 0 1rem 0;">🔑 需要配置API密钥</h3>
@@ -317,10 +316,9 @@ def show_question_interface():
             on_click=clear_question
         )
     
-    # Handle button actions with detailed debugging
+    # clear_question already ran as the button's callback; no extra rerun needed
     if clear_button:
         logger.info("🗑️ Clear button clicked")
-        st.rerun()
 
     if ask_button:
         logger.info(f"🔍 Ask button clicked! Question: '{question[:50]}...' (length: {len(question)})")
@@ -549,10 +547,9 @@ def show_query_history():
         history_col1, history_col2 = st.columns([3, 1])
         
         with history_col2:
-            if st.button("🗑️ 清空历史", use_container_width=True, help="清除所有查询历史"):
-                st.session_state.query_history = []
+            if st.button("🗑️ 清空历史", use_container_width=True, help="清除所有查询历史",
+                         on_click=_clear_query_history):
                 st.success("历史记录已清空！")
-                st.rerun()
         
         with history_col1:
             st.write(f"📊 共有 **{len(st.session_state.query_history)}** 条查询记录")
@@ -607,9 +604,8 @@ def show_query_history():
                 btn_col1, btn_col2 = st.columns(2)
                 
                 with btn_col1:
-                    if st.button(f"🔄 再次提问", key=f"reask_{i}", use_container_width=True):
-                        st.session_state.temp_question = query_record['question']
-                        st.rerun()
+                    st.button(f"🔄 再次提问", key=f"reask_{i}", use_container_width=True,
+                              on_click=_use_question, args=(query_record['question'],))
                 
                 with btn_col2:
                     if st.button(f"📎 复制问题", key=f"copy_{i}", use_container_width=True):
@@ -622,6 +618,19 @@ def show_query_history():
         </div>
         """, unsafe_allow_html=True)
 
+def _use_question(question):
+    """
+    Button callback: queue a question for the input box.
+    Runs before the click's rerun, so show_question_interface() picks it up
+    without an extra st.rerun().
+    """
+    logger.info(f"🎯 Question selected: '{question}'")
+    st.session_state.temp_question = question
+
+def _clear_query_history():
+    """Button callback: drop all stored queries before the rerun."""
+    st.session_state.query_history = []
+
 def show_example_questions():
     """
     Show enhanced example questions with categories
@@ -698,17 +707,14 @@ def show_example_questions():
             # Display questions as clickable buttons
             for i, question in enumerate(category_data['questions']):
                 question_key = f"example_{category_name}_{i}"
-                if st.button(
+                st.button(
                     f"💬 {question}",
                     key=question_key,
                     use_container_width=True,
-                    help="点击直接使用这个示例问题"
-                ):
-                    # Set the example question for use in the interface
-                    logger.info(f"🎯 Example question clicked: '{question}'")
-                    st.session_state.temp_question = question
-                    logger.info(f"💾 Stored temp_question in session state")
-                    st.rerun()
+                    help="点击直接使用这个示例问题",
+                    on_click=_use_question,
+                    args=(question,)
+                )
             
             st.markdown("<hr style='margin: 1rem 0; border: none; height: 1px; background: #dee2e6;'>", unsafe_allow_html=True)
     
@@ -761,7 +767,7 @@ def ask_question_with_agent(question, company_filter, doc_type_filter, year_filt
     with st.spinner("🤖 Agent 正在进行深度分析...这可能需要几秒钟..."):
         try:
             # 调用 Agent API
-            backend_url = os.getenv("BACKEND_URL", "http://localhost:8000")
+            backend_url = get_app_config().backend_url
             response = requests.post(
                 f"{backend_url}/agent/query",
                 json={"question": question},
@@ -819,7 +825,7 @@ def generate_full_report(company_filter, year_filter):
     with st.spinner(f"📊 正在生成 {company_name} {year}年 的完整年报分析...这可能需要 2-5 分钟..."):
         try:
             # 调用 Agent API
-            backend_url = os.getenv("BACKEND_URL", "http://localhost:8000")
+            backend_url = get_app_config().backend_url
             response = requests.post(
                 f"{backend_url}/agent/generate-report",
                 json={
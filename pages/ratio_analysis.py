@@ -3,7 +3,7 @@ import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from utils.financial_calculator import FinancialCalculator
-from utils.state import init_state, init_processors
+from utils.state import init_state, init_processors, bump_stats_version
 from utils.export_ui import add_export_section
 import logging
 
@@ -32,6 +32,7 @@ def show_ratio_analysis_page():
         # Ensure company_data exists with fallback
         if not hasattr(st.session_state, 'company_data') or st.session_state.company_data is None:
             st.session_state.company_data = {}
+            bump_stats_version()
         
         # Check for company data
         if not st.session_state.company_data:
@@ -5,7 +5,7 @@ from utils.table_extractor import TableExtractor
 from utils.rag_system import RAGSystem
 from utils.company_comparator import CompanyComparator
 from utils.enhanced_integration import get_system_integrator
-from utils.state import init_state, init_processors, get_processing_stats, clear_all_data
+from utils.state import init_state, init_processors, get_processing_stats, clear_all_data, bump_stats_version
 import logging
 
 # Configure logging
@@ -246,6 +246,9 @@ def process_uploaded_files(uploaded_files):
             progress = (i + 1) / len(valid_files)
             progress_bar.progress(progress)
         
+        # Documents/tables changed - invalidate cached stats
+        bump_stats_version()
+        
         # Check if any files were successfully processed
         successful_files = [r for r in processing_results if r['success']]
         
@@ -273,6 +276,7 @@ def process_uploaded_files(uploaded_files):
             )
             st.session_state.company_data = company_data
         
+        bump_stats_version()
         progress_bar.progress(1.0)
         status_text.text("✅ 处理完成！")
         
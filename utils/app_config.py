@@ -0,0 +1,37 @@
+"""
+Application Configuration
+
+Environment-derived settings for the Streamlit app, read once per process
+instead of calling os.getenv() on every rerun.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import streamlit as st
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    """Immutable snapshot of the environment configuration."""
+    openai_api_key: Optional[str]
+    llama_cloud_api_key: Optional[str]
+    backend_url: str
+
+    @property
+    def has_openai_key(self) -> bool:
+        return bool(self.openai_api_key) and self.openai_api_key != "default_key"
+
+
+@st.cache_resource(show_spinner=False)
+def get_app_config() -> AppConfig:
+    """
+    Build the application config from environment variables.
+    Cached as a process-wide singleton; .env must be loaded before the first call.
+    """
+    return AppConfig(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        llama_cloud_api_key=os.getenv("LLAMA_CLOUD_API_KEY"),
+        backend_url=os.getenv("BACKEND_URL", "http://localhost:8000"),
+    )
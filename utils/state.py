@@ -7,14 +7,51 @@ to prevent crashes from uninitialized state variables.
 
 import streamlit as st
 import logging
+import uuid
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Session state key -> factory for its default value
+_STATE_DEFAULTS = {
+    # Document processing state
+    'processed_documents': dict,
+    'extracted_tables': dict,
+    # RAG system state
+    'rag_index': lambda: None,
+    'query_history': list,
+    # Company analysis state
+    'company_data': dict,
+    # Processing components - initialize lazily to avoid import errors
+    'pdf_processor': lambda: None,
+    'table_extractor': lambda: None,
+    'rag_system': lambda: None,
+    'company_comparator': lambda: None,
+    'data_visualizer': lambda: None,
+    # Backward compatibility - some pages use 'visualizer' key
+    'visualizer': lambda: None,
+    # Processing status flags
+    'processing_complete': lambda: False,
+    'last_upload_time': lambda: None,
+    # Question interface state
+    'temp_question': str,
+    'persistent_question': str,
+    # Stats cache bookkeeping - see get_processing_stats()
+    '_stats_version': int,
+    '_sid': lambda: uuid.uuid4().hex,
+}
+
+# Keys that are reset to their default when they hold None
+_NON_NULL_KEYS = ('processed_documents', 'extracted_tables', 'query_history', 'company_data')
+
+# Upper bound on how stale cached stats can get if a mutation misses bump_stats_version()
+_STATS_TTL_SECONDS = 600
+
 def init_state():
     """
     Initialize all session state variables with safe defaults.
     Call this at the top of every page to prevent AttributeError crashes.
+    Existing values are left untouched, so repeated calls are cheap.
     """
     try:
         # Ensure session_state exists and is properly initialized
@@ -22,57 +59,15 @@ def init_state():
             logger.error("Streamlit session_state not available")
             return False
         
-        # Document processing state
-        if not hasattr(st.session_state, 'processed_documents') or st.session_state.processed_documents is None:
-            st.session_state.processed_documents = {}
-        
-        if not hasattr(st.session_state, 'extracted_tables') or st.session_state.extracted_tables is None:
-            st.session_state.extracted_tables = {}
-        
-        # RAG system state
-        if not hasattr(st.session_state, 'rag_index'):
-            st.session_state.rag_index = None
-        
-        if not hasattr(st.session_state, 'query_history') or st.session_state.query_history is None:
-            st.session_state.query_history = []
-        
-        # Company analysis state
-        if not hasattr(st.session_state, 'company_data') or st.session_state.company_data is None:
-            st.session_state.company_data = {}
-        
-        # Processing components - initialize lazily to avoid import errors
-        if not hasattr(st.session_state, 'pdf_processor'):
-            st.session_state.pdf_processor = None
-        
-        if not hasattr(st.session_state, 'table_extractor'):
-            st.session_state.table_extractor = None
-        
-        if not hasattr(st.session_state, 'rag_system'):
-            st.session_state.rag_system = None
-        
-        if not hasattr(st.session_state, 'company_comparator'):
-            st.session_state.company_comparator = None
-        
-        if not hasattr(st.session_state, 'data_visualizer'):
-            st.session_state.data_visualizer = None
-        
-        # Backward compatibility - some pages use 'visualizer' key
-        if not hasattr(st.session_state, 'visualizer'):
-            st.session_state.visualizer = None
+        state = st.session_state
+        for key, default in _STATE_DEFAULTS.items():
+            if key not in state:
+                state[key] = default()
         
-        # Processing status flags
-        if not hasattr(st.session_state, 'processing_complete'):
-            st.session_state.processing_complete = False
-
-        if not hasattr(st.session_state, 'last_upload_time'):
-            st.session_state.last_upload_time = None
-
-        # Question interface state
-        if not hasattr(st.session_state, 'temp_question'):
-            st.session_state.temp_question = ""
-
-        if not hasattr(st.session_state, 'persistent_question'):
-            st.session_state.persistent_question = ""
+        for key in _NON_NULL_KEYS:
+            if state[key] is None:
+                state[key] = _STATE_DEFAULTS[key]()
+                bump_stats_version()
             
         logger.debug("Session state initialized successfully")
         return True
@@ -122,9 +117,36 @@ def init_processors():
         st.error(f"Error initializing processing components: {str(e)}")
         return False
 
+def bump_stats_version():
+    """
+    Invalidate the cached processing stats.
+    Call this after mutating documents, tables, companies or the RAG index.
+    """
+    st.session_state._stats_version = st.session_state.get('_stats_version', 0) + 1
+
+@st.cache_data(show_spinner=False, max_entries=256, ttl=_STATS_TTL_SECONDS)
+def _cached_stats(version: int, session_id: str) -> Dict[str, Any]:
+    """
+    Cached wrapper around _compute_processing_stats().
+    The arguments only form the cache key: session_id keeps sessions apart
+    and version changes whenever bump_stats_version() is called.
+    """
+    return _compute_processing_stats()
+
 def get_processing_stats() -> Dict[str, Any]:
     """
     Get current processing statistics safely.
+    Results are cached per session until bump_stats_version() is called
+    or _STATS_TTL_SECONDS have passed.
+    """
+    return _cached_stats(
+        st.session_state.get('_stats_version', 0),
+        st.session_state.get('_sid', '')
+    )
+
+def _compute_processing_stats() -> Dict[str, Any]:
+    """
+    Compute processing statistics from session state (uncached).
     """
     stats = {
         'documents_count': len(st.session_state.processed_documents),
@@ -147,6 +169,7 @@ def clear_all_data():
         st.session_state.query_history = []
         st.session_state.processing_complete = False
         st.session_state.last_upload_time = None
+        bump_stats_version()
         
         # Reset RAG system if it exists
         if st.session_state.rag_system: